@@ -0,0 +1,30 @@
+import os
+import time
+from typing import Callable
+
+
+def setup_django():
+    """
+    Configures Django with the project settings and an in-memory test database.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+
+    import django
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def measure(fn: Callable[[], object], repeat: int = 5) -> float:
+    """
+    Returns the best wall time of `repeat` runs in milliseconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
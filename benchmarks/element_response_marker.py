@@ -0,0 +1,86 @@
+"""
+Compares a `wrapt.ObjectProxy` around element responses with the marker attribute
+used by `ElementResponse` on a middleware-heavy response path. Reports the best of
+alternating runs, so that noise of the machine does not swap the results.
+
+    python -m benchmarks.element_response_marker
+"""
+
+from benchmarks._django import measure, setup_django
+
+setup_django()
+
+import wrapt  # noqa: E402
+from django.contrib.messages.middleware import MessageMiddleware  # noqa: E402
+from django.contrib.sessions.middleware import SessionMiddleware  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.middleware.clickjacking import XFrameOptionsMiddleware  # noqa: E402
+from django.middleware.common import CommonMiddleware  # noqa: E402
+from django.middleware.csrf import CsrfViewMiddleware  # noqa: E402
+from django.middleware.http import ConditionalGetMiddleware  # noqa: E402
+from django.middleware.security import SecurityMiddleware  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django_htmx.middleware import HtmxMiddleware  # noqa: E402
+
+from hyperpony.element import ElementMeta, ElementResponse  # noqa: E402
+from hyperpony.middleware import HyperponyMiddleware  # noqa: E402
+
+MIDDLEWARE = [
+    SecurityMiddleware,
+    SessionMiddleware,
+    CommonMiddleware,
+    CsrfViewMiddleware,
+    MessageMiddleware,
+    XFrameOptionsMiddleware,
+    ConditionalGetMiddleware,
+    HtmxMiddleware,
+    HyperponyMiddleware,
+]
+
+
+class ProxiedElementResponse(wrapt.ObjectProxy):
+    pass
+
+
+def proxied_view(request):
+    response = HttpResponse("<p>element</p>")
+    return ProxiedElementResponse(ElementResponse.wrap(response, ElementMeta(element_id="e")))
+
+
+def marked_view(request):
+    return ElementResponse.wrap(HttpResponse("<p>element</p>"), ElementMeta(element_id="e"))
+
+
+def build_handler(view):
+    handler = view
+    for middleware in reversed(MIDDLEWARE):
+        handler = middleware(handler)
+    return handler
+
+
+def main():
+    rf = RequestFactory()
+    iterations = 500
+    rounds = 30
+    runs = {}
+    for name, view in (("proxy", proxied_view), ("marker", marked_view)):
+        handler = build_handler(view)
+
+        def run(handler=handler):
+            for _ in range(iterations):
+                response = handler(rf.get("/", HTTP_HX_REQUEST="true"))
+                isinstance(response, ElementResponse)
+
+        runs[name] = run
+
+    # the variants alternate, so that drift of the machine affects both alike
+    best = {name: float("inf") for name in runs}
+    for _ in range(rounds):
+        for name, run in runs.items():
+            best[name] = min(best[name], measure(run, repeat=1))
+    for name, ms in best.items():
+        print(f"{name:>7}: {ms / iterations * 1000:6.1f}us per request (best of {rounds})")
+
+
+if __name__ == "__main__":
+    main()
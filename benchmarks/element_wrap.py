@@ -0,0 +1,60 @@
+"""
+Compares the previous decode/format/encode element wrapping with the chunk-based
+wrapping of `ElementResponse.wrap()` on 100 KB and 1 MB element bodies. The peak
+allocation is reported in multiples of the body size, i.e. the number of copies.
+
+    python -m benchmarks.element_wrap
+"""
+
+import tracemalloc
+
+from benchmarks._django import measure, setup_django
+
+setup_django()
+
+from django.http import HttpResponse  # noqa: E402
+
+from hyperpony.element import ElementMeta, ElementResponse  # noqa: E402
+from hyperpony.utils import response_to_str  # noqa: E402
+
+
+def legacy_wrap(response: HttpResponse, meta: ElementMeta):
+    attr_id = f"id='{meta.element_id}'"
+    attr_hx_target = f"hx-target='{meta.hx_target}'"
+    attr_hx_swap = f"hx-swap='{meta.hx_swap}'"
+    content = response_to_str(response)
+    wrapped = (
+        f"<{meta.tag} {attr_id} {attr_hx_target} {attr_hx_swap}  hyperpony-element>"
+        f"{content}"
+        f"</{meta.tag}>"
+    )
+    response.content = bytes(wrapped, "UTF-8")
+    return response
+
+
+def chunk_wrap(response: HttpResponse, meta: ElementMeta):
+    return ElementResponse.wrap(response, meta)
+
+
+def peak_copies(wrap, body: bytes) -> float:
+    response = HttpResponse(body)
+    tracemalloc.start()
+    wrapped = wrap(response, ElementMeta(element_id="bench"))
+    _ = wrapped.content  # the outermost response is joined once
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / len(body)
+
+
+def main():
+    print(f"{'body':>8} {'variant':>8} {'time':>10} {'copies':>7}")
+    for label, size in (("100 KB", 100 * 1024), ("1 MB", 1024 * 1024)):
+        body = ("<p>ümlaut</p>" * (size // 14 + 1)).encode()[:size]
+        body = body.decode(errors="ignore").encode()
+        for name, wrap in (("legacy", legacy_wrap), ("chunks", chunk_wrap)):
+            ms = measure(lambda: wrap(HttpResponse(body), ElementMeta(element_id="x")).content, 20)
+            print(f"{label:>8} {name:>8} {ms:>8.3f}ms {peak_copies(wrap, body):>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
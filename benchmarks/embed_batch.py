@@ -0,0 +1,65 @@
+"""
+Compares `embed()` in a loop with `embed_batch()` for 10, 100 and 1000 rows.
+
+    python -m benchmarks.embed_batch
+"""
+
+from benchmarks._django import measure, setup_django
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.template import Context, Template  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.views import View  # noqa: E402
+
+from hyperpony import ElementMixin, InjectParamsMixin, param, SingletonPathMixin  # noqa: E402
+from main.models import AppUser  # noqa: E402
+
+ROW_TEMPLATE = Template("<td>{{ item.username }}</td><td>{{ item.email }}</td>")
+
+
+class RowElement(SingletonPathMixin, InjectParamsMixin, ElementMixin, View):
+    tag = "tr"
+    item: AppUser = param()
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(ROW_TEMPLATE.render(Context({"item": self.item})))
+
+
+urlpatterns = [RowElement.create_path("<uuid:item>")]
+
+
+def main():
+    users = AppUser.objects.bulk_create(
+        AppUser(username=f"user{i}", email=f"user{i}@example.com") for i in range(1000)
+    )
+    request = RequestFactory().get("/")
+
+    print(f"{'rows':>6} {'embed loop':>12} {'queries':>8} {'embed_batch':>12} {'queries':>8}")
+    with override_settings(ROOT_URLCONF=__name__):
+        for rows in (10, 100, 1000):
+            pks = [u.id for u in users[:rows]]
+
+            def loop():
+                return [RowElement.embed(request, kwargs={"item": pk}) for pk in pks]
+
+            def batch():
+                return RowElement.embed_batch(request, [{"item": pk} for pk in pks])
+
+            assert loop() == batch()
+            with CaptureQueriesContext(connection) as loop_queries:
+                loop()
+            with CaptureQueriesContext(connection) as batch_queries:
+                batch()
+
+            print(
+                f"{rows:>6} {measure(loop):>10.1f}ms {len(loop_queries):>8} "
+                f"{measure(batch):>10.1f}ms {len(batch_queries):>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures the overhead of `HyperponyMiddleware` on page responses without response
+handlers or OOB fragments and with all request features (profilers, server pressure,
+load shedding, render budgets) disabled, compared with the previous implementation
+that always decoded and re-encoded the body.
+
+    python -m benchmarks.middleware_overhead
+"""
+
+from benchmarks._django import measure, setup_django
+
+setup_django()
+
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+
+from hyperpony.middleware import HyperponyMiddleware  # noqa: E402
+from hyperpony.utils import is_response_processable, response_to_str  # noqa: E402
+
+
+def legacy_middleware(get_response):
+    def middleware(request):
+        response = get_response(request)
+        handlers = getattr(request, "__hyperpony_view_response_handlers", [])
+        setattr(request, "__hyperpony_view_response_handlers", handlers)
+        for handler in handlers:
+            result = handler(response)
+            response = result if result is not None else response
+        if is_response_processable(response, "text/html"):
+            content = response_to_str(response)
+            bcontent = bytes(content, "UTF-8")
+            for oob in getattr(response, "_hyperpony_swap_oob", []):
+                bcontent += oob
+            response.content = bcontent
+        return response
+
+    return middleware
+
+
+@override_settings(HYPERPONY_PROFILER=False)
+def main():
+    request = RequestFactory().get("/")
+    iterations = 200
+    print(f"{'page':>8} {'no middleware':>14} {'legacy':>10} {'hyperpony':>10}")
+    for label, size in (("10 KB", 10 * 1024), ("1 MB", 1024 * 1024)):
+        body = b"<p>x</p>" * (size // 8)
+
+        def view(_request):
+            return HttpResponse(body)
+
+        def run(handler):
+            return lambda: [handler(request) for _ in range(iterations)]
+
+        results = [
+            measure(run(handler)) / iterations * 1000
+            for handler in (view, legacy_middleware(view), HyperponyMiddleware(view))
+        ]
+        print(f"{label:>8} {results[0]:>12.1f}us {results[1]:>8.1f}us {results[2]:>8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,10 @@ from django.utils.safestring import mark_safe
 from django.views.generic.base import ContextMixin
 from pydantic import BaseModel, create_model
 
-from hyperpony.views import ElementIdMixin, ElementAttrsMixin
+from hyperpony.context import get_hyperpony_context
+from hyperpony.metrics import client_state_bytes, is_metrics_enabled
+from hyperpony.tracing import ATTR_BYTES, ATTR_ELEMENT_CLASS, ATTR_ELEMENT_ID, start_span
+from hyperpony.element import ElementIdMixin, ElementAttrsMixin, _format_attrs
 
 
 @dataclass()
@@ -50,6 +53,7 @@ class ClientStateViewConfig:
 
 class ClientStateMixin(ElementAttrsMixin, ElementIdMixin, ContextMixin):
     is_client_state_present = False
+    client_state_bytes = 0
 
     def __process_hyperpony_client_states(self) -> ClientStateViewConfig:
         cls = self.__class__
@@ -94,14 +98,27 @@ class ClientStateMixin(ElementAttrsMixin, ElementIdMixin, ContextMixin):
         for k, v in client_state_config.client_state_fields.items():
             setattr(self, k, v.default)
 
-        if getattr(request, "htmx", False) and not hasattr(request, "_hyperpony_client_state"):
-            setattr(request, "_hyperpony_client_state", _extract_client_states(request))
+        context = get_hyperpony_context(request)
+        if getattr(request, "htmx", False) and context.client_state is None:
+            context.client_state = _extract_client_states(request)
 
-        if client_state := getattr(request, "_hyperpony_client_state", None):
+        if client_state := context.client_state:
             if client_state_element := client_state.get(self.get_element_id(), None):
                 self.is_client_state_present = True
-                model = client_state_config.schema_in.model_validate_json(client_state_element)
-                data = model.model_dump()
+                if is_metrics_enabled():
+                    client_state_bytes.inc(
+                        (self.__class__.__name__, "in"), len(client_state_element)
+                    )
+                with start_span(
+                    "hyperpony.client_state.decode",
+                    {
+                        ATTR_ELEMENT_ID: self.get_element_id(),
+                        ATTR_ELEMENT_CLASS: self.__class__.__name__,
+                        ATTR_BYTES: len(client_state_element),
+                    },
+                ):
+                    model = client_state_config.schema_in.model_validate_json(client_state_element)
+                    data = model.model_dump()
                 for k, v in data.items():
                     setattr(self, k, v)
 
@@ -123,20 +140,31 @@ class ClientStateMixin(ElementAttrsMixin, ElementIdMixin, ContextMixin):
 
     def get_client_state_dict(self) -> dict[str, str]:
         meta = self._hyperpony_client_state_config()
-        data = {}
-        for k in meta.schema_out.model_fields.keys():
-            data[k] = getattr(self, k)
-
-        model: BaseModel = meta.schema_out(**data)
-        x_data = {
-            "client_state": model.model_dump(),
-            "client_to_server_includes": meta.client_to_server_includes,
-        }
-        x_data_str = escape(orjson.dumps(x_data).decode())
-        return {
-            "__hyperpony_client_state__": self.get_element_id(),
-            "x-data": x_data_str,
-        }
+        with start_span(
+            "hyperpony.client_state.encode",
+            {ATTR_ELEMENT_ID: self.get_element_id(), ATTR_ELEMENT_CLASS: self.__class__.__name__},
+        ) as span:
+            data = {}
+            for k in meta.schema_out.model_fields.keys():
+                data[k] = getattr(self, k)
+
+            model: BaseModel = meta.schema_out(**data)
+            x_data = {
+                "client_state": model.model_dump(),
+                "client_to_server_includes": meta.client_to_server_includes,
+            }
+            x_data_str = escape(orjson.dumps(x_data).decode())
+            attrs = {
+                "__hyperpony_client_state__": self.get_element_id(),
+                "x-data": x_data_str,
+            }
+            # picked up by ElementMixin for the byte accounting of the element
+            self.client_state_bytes = len(_format_attrs(attrs).encode())
+            if span is not None:
+                span.set_attribute(ATTR_BYTES, self.client_state_bytes)
+        if is_metrics_enabled():
+            client_state_bytes.inc((self.__class__.__name__, "out"), self.client_state_bytes)
+        return attrs
 
     def get_client_state_attrs(self):
         joined = " ".join(f' {k}="{v}" ' for k, v in self.get_client_state_dict().items())
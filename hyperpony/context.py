@@ -0,0 +1,67 @@
+from typing import Any, Optional, TYPE_CHECKING
+
+from django.http import HttpRequest
+
+if TYPE_CHECKING:
+    from hyperpony.deadlines import RenderDeadline
+    from hyperpony.guardrails import EmbedGuard
+    from hyperpony.memory import MemoryProfile
+    from hyperpony.profiler import EmbedProfile
+    from hyperpony.queries import QueryLog
+    from hyperpony.response_handler import RESPONSE_HANDLER
+
+
+class HyperponyContext:
+    """
+    State shared by a request and all its embedded requests. `EmbeddedRequest.create()`
+    passes the context of the original request on, so every request of a tree holds a
+    reference to the same instance.
+    """
+
+    __slots__ = (
+        "response_handlers",
+        "deferred_swap_oobs",
+        "client_state",
+        "parsed_bodies",
+        "identity_map",
+        "profile",
+        "deadline",
+        "embed_guard",
+        "memory_profile",
+        "query_log",
+    )
+
+    def __init__(self):
+        self.response_handlers: list["RESPONSE_HANDLER"] = []
+        # keys of the registered deferred OOB swaps, see `add_deferred_swap_oob()`
+        self.deferred_swap_oobs: set[Any] = set()
+        # client states sent by the browser, extracted on first access
+        self.client_state: Optional[dict[str, Any]] = None
+        # parsed request bodies of the root request, by content type
+        self.parsed_bodies: dict[str, Any] = {}
+        # model instances loaded by parameters, by (model class, str(pk)). Only used if
+        # HYPERPONY_IDENTITY_MAP is enabled and cleared before the response handlers run,
+        # views rendered by handlers (e.g. deferred OOB swaps) see changes of the request.
+        self.identity_map: dict[tuple[type, str], Any] = {}
+        self.profile: Optional["EmbedProfile"] = None
+        self.deadline: Optional["RenderDeadline"] = None
+        self.embed_guard: Optional["EmbedGuard"] = None
+        self.memory_profile: Optional["MemoryProfile"] = None
+        self.query_log: Optional["QueryLog"] = None
+
+
+def get_hyperpony_context(request: HttpRequest) -> HyperponyContext:
+    try:
+        return request.hyperpony_context  # type: ignore[attr-defined]
+    except AttributeError:
+        # no middleware: the context is created on first access
+        context = HyperponyContext()
+        setattr(request, "hyperpony_context", context)
+        return context
+
+
+def find_hyperpony_context(request: HttpRequest) -> Optional[HyperponyContext]:
+    """
+    Returns the context of the request tree without creating it.
+    """
+    return getattr(request, "hyperpony_context", None)
@@ -0,0 +1,35 @@
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from hyperpony.context import find_hyperpony_context, get_hyperpony_context
+from hyperpony.middleware import HyperponyMiddleware
+from hyperpony.views import EmbeddedRequest
+
+
+def test_embedded_requests_share_the_context(rf: RequestFactory):
+    request = rf.get("/")
+    embedded = EmbeddedRequest.create(request)
+    nested = EmbeddedRequest.create(embedded)
+
+    context = get_hyperpony_context(request)
+    assert embedded.hyperpony_context is context
+    assert nested.hyperpony_context is context
+
+
+def test_context_is_not_created_by_lookup(rf: RequestFactory):
+    assert find_hyperpony_context(rf.get("/")) is None
+
+
+def test_middleware_creates_a_context_per_request(rf: RequestFactory):
+    contexts = []
+
+    def view(request):
+        contexts.append(find_hyperpony_context(request))
+        return HttpResponse("")
+
+    middleware = HyperponyMiddleware(view)
+    middleware(rf.get("/"))
+    middleware(rf.get("/"))
+    assert contexts[0] is not None
+    assert contexts[1] is not None
+    assert contexts[0] is not contexts[1]
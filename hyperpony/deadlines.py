@@ -0,0 +1,106 @@
+import logging
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils.html import escape
+
+from hyperpony.context import get_hyperpony_context
+from hyperpony.metrics import render_budget_fallbacks
+
+
+logger = logging.getLogger("hyperpony.deadlines")
+
+
+class RenderDeadline:
+    """
+    Tracks the render budget of a request tree. The budget is shared by the root
+    request and all its embedded requests.
+    """
+
+    def __init__(self, budget: Optional[float]):
+        self.budget = budget
+        self.start = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def remaining(self) -> Optional[float]:
+        if self.budget is None:
+            return None
+        return self.budget - self.elapsed()
+
+
+def get_request_render_budget() -> Optional[float]:
+    return getattr(settings, "HYPERPONY_REQUEST_RENDER_BUDGET", None)
+
+
+def start_request_deadline(request: HttpRequest, budget: float) -> RenderDeadline:
+    deadline = RenderDeadline(budget)
+    get_hyperpony_context(request).deadline = deadline
+    return deadline
+
+
+def get_request_deadline(request: HttpRequest) -> Optional[RenderDeadline]:
+    deadline = get_hyperpony_context(request).deadline
+    if deadline is None:
+        # no middleware: the budget starts with the first embed
+        budget = get_request_render_budget()
+        if budget is not None:
+            deadline = start_request_deadline(request, budget)
+    return deadline
+
+
+def get_render_budget(view_class: type) -> Optional[float]:
+    return getattr(view_class, "render_budget", None)
+
+
+def is_budget_exhausted(request: HttpRequest, view_class: type) -> bool:
+    """
+    Returns True if an embed of `view_class` should not be started anymore. This is the
+    case if the request's budget is spent, or if the remaining budget is smaller than
+    the view's own `render_budget`.
+    """
+    deadline = get_request_deadline(request)
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is None:
+        return False
+    element_budget = get_render_budget(view_class)
+    return remaining <= 0 or (element_budget is not None and remaining < element_budget)
+
+
+def check_render_budget(view_class: type, duration: float):
+    element_budget = get_render_budget(view_class)
+    if element_budget is not None and duration > element_budget:
+        logger.warning(
+            "%s exceeded its render budget (%.1f ms > %.1f ms)",
+            view_class.__name__,
+            duration * 1000,
+            element_budget * 1000,
+        )
+
+
+def record_fallback(view_class: type):
+    # always counted, independent of HYPERPONY_METRICS
+    render_budget_fallbacks.inc((view_class.__name__,))
+    logger.info("render budget exhausted, returning placeholder for %s", view_class.__name__)
+
+
+def get_fallback_counts() -> dict[str, int]:
+    return {labels[0]: int(count) for labels, count in render_budget_fallbacks.values().items()}
+
+
+def reset_fallback_counts():
+    render_budget_fallbacks.reset()
+
+
+def placeholder_response(element_id: str, url: str) -> HttpResponse:
+    """
+    Returns a placeholder with the element's id that lazy-loads the element from `url`
+    once it is swapped into the page.
+    """
+    return HttpResponse(
+        f"<div id='{escape(element_id)}' hx-get='{escape(url)}' hx-trigger='load' "
+        f"hx-swap='outerHTML' hyperpony-placeholder></div>"
+    )
@@ -0,0 +1,95 @@
+import time
+
+import lxml.html
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+
+from hyperpony import ElementMixin, SingletonPathMixin
+from hyperpony.deadlines import get_fallback_counts, reset_fallback_counts
+from hyperpony.middleware import HyperponyMiddleware
+
+
+class SlowElement(SingletonPathMixin, ElementMixin, View):
+    def get(self, request, *args, **kwargs):
+        time.sleep(0.02)
+        return HttpResponse("slow")
+
+
+class BudgetedElement(SingletonPathMixin, ElementMixin, View):
+    render_budget = 10.0
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse("budgeted")
+
+
+class RowElement(SingletonPathMixin, ElementMixin, View):
+    render_budget = 10.0
+
+    def get_element_id(self) -> str:
+        return f"row-{self.kwargs['row']}"
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse("row")
+
+
+urlpatterns = [
+    SlowElement.create_path(),
+    BudgetedElement.create_path(),
+    RowElement.create_path("<int:row>"),
+]
+
+
+@pytest.fixture(autouse=True)
+def _reset_counts():
+    reset_fallback_counts()
+
+
+def _page(request):
+    first = SlowElement.embed(request)
+    second = SlowElement.embed(request, GET={"page": "2"})
+    return HttpResponse(f"{first}|{second}")
+
+
+@pytest.mark.urls("hyperpony.deadlines_tests")
+@override_settings(HYPERPONY_REQUEST_RENDER_BUDGET=0.01)
+def test_embed_after_spent_budget_returns_placeholder(rf: RequestFactory):
+    response = HyperponyMiddleware(_page)(rf.get("/"))
+    first, second = response.content.decode().split("|")
+
+    assert "slow" in first
+    placeholder = lxml.html.fromstring(second)
+    assert placeholder.attrib["id"] == "SlowElement"
+    assert placeholder.attrib["hx-get"] == "/SlowElement?page=2"
+    assert placeholder.attrib["hx-trigger"] == "load"
+    assert "hyperpony-placeholder" in placeholder.attrib
+    assert get_fallback_counts() == {"SlowElement": 1}
+
+
+@pytest.mark.urls("hyperpony.deadlines_tests")
+@override_settings(HYPERPONY_REQUEST_RENDER_BUDGET=1.0)
+def test_element_budget_larger_than_remaining_budget(rf: RequestFactory):
+    response = HyperponyMiddleware(lambda r: HttpResponse(BudgetedElement.embed(r)))(rf.get("/"))
+    assert "hyperpony-placeholder" in response.content.decode()
+    assert get_fallback_counts() == {"BudgetedElement": 1}
+
+
+@pytest.mark.urls("hyperpony.deadlines_tests")
+@override_settings(HYPERPONY_REQUEST_RENDER_BUDGET=None)
+def test_no_budget_never_falls_back(rf: RequestFactory):
+    response = HyperponyMiddleware(_page)(rf.get("/"))
+    assert response.content.decode().count("slow") == 2
+    assert get_fallback_counts() == {}
+
+
+@pytest.mark.urls("hyperpony.deadlines_tests")
+@override_settings(HYPERPONY_REQUEST_RENDER_BUDGET=1.0)
+def test_placeholder_uses_the_instance_element_id(rf: RequestFactory):
+    def page(request):
+        return HttpResponse("".join(RowElement.embed(request, kwargs={"row": r}) for r in (1, 2)))
+
+    response = HyperponyMiddleware(page)(rf.get("/"))
+    placeholders = lxml.html.fragments_fromstring(response.content.decode())
+    assert [p.attrib["id"] for p in placeholders] == ["row-1", "row-2"]
+    assert [p.attrib["hx-get"] for p in placeholders] == ["/RowElement/1", "/RowElement/2"]
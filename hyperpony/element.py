@@ -1,16 +1,117 @@
+import hashlib
+import logging
+import time
+from urllib.parse import urlencode
 from dataclasses import dataclass, field
-from typing import cast, Optional
+from typing import Any, cast, Optional
 
-import wrapt
-from django.http import HttpResponse, HttpResponseBase
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseBase, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django_htmx.http import reswap
 
-from hyperpony.utils import is_response_processable, response_to_str
-from hyperpony.views import (
-    ElementIdMixin,
-    ElementAttrsMixin,
+from hyperpony.context import find_hyperpony_context
+
+from hyperpony.metrics import (
+    element_not_modified,
+    element_render_seconds,
+    element_renders,
+    element_bytes,
+    is_metrics_enabled,
+)
+from hyperpony.polling import PollingPolicy, apply_polling_policy
+from hyperpony.shedding import Priority
+from hyperpony.tracing import ATTR_BYTES, ATTR_ELEMENT_CLASS, ATTR_ELEMENT_ID, start_span
+from hyperpony.utils import (
+    has_content_type,
+    render_response,
+    response_content_length,
+    surround_response_content,
+    surround_streaming_content,
 )
 
 
+logger = logging.getLogger("hyperpony.element")
+
+VERSION_ATTRIBUTE = "hyperpony-version"
+VERSION_HEADER = "X-Hyperpony-Version"
+
+
+class ElementIdMixin:
+    element_id: Optional[str] = None
+
+    def get_element_id(self) -> str:
+        return self.element_id or self.__class__.__name__
+
+
+class ElementAttrsMixin:
+    def get_attrs(self) -> dict[str, str]:
+        return {}
+
+
+def _format_attrs(attrs: dict[str, str]) -> str:
+    return " ".join(f' {k}="{v}" ' for k, v in attrs.items())
+
+
+def _format_opening_tag(head: str, element_id: Optional[str], tail: str, attrs_str: str) -> str:
+    attr_id = f"id='{element_id}'" if element_id is not None else ""
+    return f"{head}{attr_id}{tail}{attrs_str} hyperpony-element>"
+
+
+@dataclass(frozen=True)
+class ElementMarkup:
+    """
+    The static part of an element's wrapper markup (tag, hx-target, hx-swap and
+    class-level attrs). It is compiled once per element class so that only the
+    element id and the dynamic attrs are formatted per request.
+    """
+
+    tag: str
+    hx_target: str
+    hx_swap: str
+    attrs: dict[str, str]
+    head: str
+    tail: str
+    attrs_str: str
+    closing: str
+
+    @classmethod
+    def compile(
+        cls, tag: str, hx_target: str, hx_swap: str, attrs: dict[str, str]
+    ) -> "ElementMarkup":
+        attr_hx_target = f"hx-target='{hx_target}'" if hx_target else ""
+        attr_hx_swap = f"hx-swap='{hx_swap}'" if hx_swap else ""
+        return cls(
+            tag=tag,
+            hx_target=hx_target,
+            hx_swap=hx_swap,
+            attrs=dict(attrs),
+            head=f"<{tag} ",
+            tail=f" {attr_hx_target} {attr_hx_swap} ",
+            attrs_str=_format_attrs(attrs),
+            closing=f"</{tag}>",
+        )
+
+    def opening_tag(self, element_id: Optional[str], attrs: dict[str, str]) -> Optional[str]:
+        """
+        Returns the opening tag for the given id and attrs, or None if `attrs` does not
+        contain the static attrs unchanged.
+        """
+        dynamic = {}
+        for k, v in attrs.items():
+            static_value = self.attrs.get(k)
+            if static_value is None:
+                dynamic[k] = v
+            elif static_value != v:
+                return None
+        if len(attrs) - len(dynamic) != len(self.attrs):
+            return None
+
+        attrs_str = " ".join(s for s in (self.attrs_str, _format_attrs(dynamic)) if s)
+        return _format_opening_tag(self.head, element_id, self.tail, attrs_str)
+
+
 @dataclass()
 class ElementMeta:
     element_id: Optional[str] = None
@@ -19,9 +120,62 @@ class ElementMeta:
     hx_swap: str = "outerHTML"
     attrs: dict[str, str] = field(default_factory=dict)
     nowrap: bool = False
+    markup: Optional[ElementMarkup] = None
+    name: Optional[str] = None
+    # byte accounting, set by wrap(). inner_bytes is None for streaming responses.
+    inner_bytes: Optional[int] = None
+    wrapper_bytes: int = 0
+    client_state_bytes: int = 0
+
+    def tags(self) -> tuple[str, str]:
+        """
+        Returns the opening and closing tag of the element wrapper.
+        """
+        if self.markup is not None:
+            opening = self.markup.opening_tag(self.element_id, self.attrs)
+            if opening is not None:
+                return opening, self.markup.closing
+
+        attr_hx_target = f"hx-target='{self.hx_target}'" if self.hx_target else ""
+        attr_hx_swap = f"hx-swap='{self.hx_swap}'" if self.hx_swap else ""
+        opening = _format_opening_tag(
+            f"<{self.tag} ",
+            self.element_id,
+            f" {attr_hx_target} {attr_hx_swap} ",
+            _format_attrs(self.attrs),
+        )
+        return opening, f"</{self.tag}>"
+
+
+def get_element_meta(response: HttpResponseBase) -> Optional[ElementMeta]:
+    """
+    Returns the `ElementMeta` of an element response, or None for other responses.
+    """
+    meta = getattr(response, "hyperpony_element_meta", None)
+    return meta if isinstance(meta, ElementMeta) else None
+
 
+class _ElementResponseType(type):
+    def __instancecheck__(cls, instance) -> bool:
+        return get_element_meta(instance) is not None
+
+
+class ElementResponse(metaclass=_ElementResponseType):
+    """
+    Element responses are regular Django responses marked with the
+    `hyperpony_element_meta` attribute. `isinstance(response, ElementResponse)` checks
+    for the marker, and `ElementResponse(response)` marks and returns the response
+    itself, so no proxy sits between the response and Django.
+    """
+
+    def __new__(cls, response: HttpResponseBase) -> Any:
+        return cls.mark(response, ElementMeta(nowrap=True))
+
+    @staticmethod
+    def mark(response: HttpResponseBase, meta: ElementMeta) -> HttpResponseBase:
+        setattr(response, "hyperpony_element_meta", meta)
+        return response
 
-class ElementResponse(wrapt.ObjectProxy):
     @staticmethod
     def empty() -> HttpResponse:
         return cast(HttpResponse, ElementResponse(HttpResponse()))
@@ -32,53 +186,249 @@ class ElementResponse(wrapt.ObjectProxy):
             raise TypeError(f"View function returned {type(response)}, expected HttpResponseBase")
 
         if isinstance(response, ElementResponse):
-            return cast(HttpResponseBase, response)
+            return response
 
         if meta.nowrap:
-            return cast(
-                HttpResponseBase,
-                (response if isinstance(response, ElementResponse) else ElementResponse(response)),
-            )
+            return ElementResponse.mark(response, meta)
 
-        if is_response_processable(response, "text/html"):
-            attr_id = f"id='{meta.element_id}'" if meta.element_id is not None else ""
-            attr_hx_target = f"hx-target='{meta.hx_target}'" if meta.hx_target else ""
-            attr_hx_swap = f"hx-swap='{meta.hx_swap}'" if meta.hx_swap else ""
-            attrs_str = " ".join(f' {k}="{v}" ' for k, v in meta.attrs.items())
-            content = response_to_str(response)
-            wrapped = (
-                f"""<{meta.tag} {attr_id} {attr_hx_target} {attr_hx_swap} {attrs_str} hyperpony-element>"""
-                f"""{content}"""
-                f"""</{meta.tag}>"""
-            )
-            response.content = bytes(wrapped, "UTF-8")
+        if has_content_type(response, "text/html"):
+            with start_span(
+                "hyperpony.wrap",
+                {ATTR_ELEMENT_ID: meta.element_id, ATTR_ELEMENT_CLASS: meta.name},
+            ) as span:
+                opening, closing = meta.tags()
+                head = opening.encode(response.charset)
+                tail = closing.encode(response.charset)
+                meta.wrapper_bytes = len(head) + len(tail)
+                if span is not None:
+                    span.set_attribute(ATTR_BYTES, meta.wrapper_bytes)
+                if isinstance(response, StreamingHttpResponse):
+                    surround_streaming_content(response, head, tail)
+                elif isinstance(response, HttpResponse):
+                    render_response(response)
+                    meta.inner_bytes = response_content_length(response)
+                    surround_response_content(response, head, tail)
 
-        return cast(HttpResponseBase, ElementResponse(response))
+        return ElementResponse.mark(response, meta)
 
     @classmethod
     def nowrap(cls, response: HttpResponseBase):
         return cls.wrap(response, ElementMeta(nowrap=True))
 
 
+def _is_conditional_request(request: HttpRequest) -> bool:
+    # embedded requests render into their parent's response
+    return request.method in ("GET", "HEAD") and not getattr(request, "hyperpony_embedded", False)
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _set_etag(response: HttpResponseBase, etag: str) -> HttpResponseBase:
+    response["ETag"] = etag
+    # the browser must revalidate, otherwise htmx would not see changes
+    if not response.has_header("Cache-Control"):
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _is_etag_stable(request: HttpRequest, response: HttpResponseBase) -> bool:
+    # response handlers and OOB swaps change the content after the element rendered
+    context = find_hyperpony_context(request)
+    return (
+        200 <= response.status_code < 300
+        and getattr(response, "_hyperpony_swap_oob", None) is None
+        and (context is None or len(context.response_handlers) == 0)
+    )
+
+
+def _get_not_modified_response(request: HttpRequest, etag: str) -> Optional[HttpResponseBase]:
+    response = get_conditional_response(
+        request, etag=etag, response=_set_etag(HttpResponse(), etag)
+    )
+    return response if response.status_code == 304 else None
+
+
 class ElementMixin(ElementAttrsMixin, ElementIdMixin):
     tag: str = "div"
     hx_target: str = "this"
     hx_swap: str = "outerHTML"
     attrs: Optional[dict[str, str]] = None
     nowrap: bool = False
+    render_budget: Optional[float] = None
+    """
+    Expected worst-case render time in seconds. If the request's remaining render budget
+    (`HYPERPONY_REQUEST_RENDER_BUDGET`) is smaller, `embed()` returns a lazy-loading
+    placeholder instead of rendering the element.
+    """
+    byte_budget: Optional[int] = None
+    """
+    Maximum size of the wrapped element in bytes. Larger elements are logged as warning.
+    Defaults to `HYPERPONY_ELEMENT_BYTE_BUDGET`.
+    """
+    use_etag: bool = False
+    """
+    Adds a strong ETag, computed over the wrapped content, to GET responses and answers
+    matching `If-None-Match` headers with 304. Elements that declare a version key with
+    `get_version_key()` don't need this.
+    """
+    unchanged_status: int = 204
+    """
+    Status of the empty response to polling requests whose version is unchanged, see
+    `get_version_key()`. Use 286 to stop htmx polling.
+    """
+    polling_policy: Optional[PollingPolicy] = None
+    """
+    Adapts the `every` interval of the element's `hx-trigger` to the element's change
+    frequency and the server pressure. The element that polls needs an id if it is
+    replaced by the response, the element wrapper has one.
+    """
+    priority: Optional[Priority] = None
+    """
+    Priority of the element's polls when the server is over capacity
+    (`HYPERPONY_LOAD_SHEDDING_MAX_IN_FLIGHT`), see `hyperpony.shedding`. Defaults to LOW.
+    """
+
+    def get_version_key(self) -> Optional[str]:
+        """
+        Returns a cheap key that changes whenever the element's content changes, e.g. a
+        `updated_at` timestamp. The key must cover all request parameters the content
+        depends on.
+
+        If set, the ETag is derived from the key and checked before rendering, a matching
+        `If-None-Match` skips rendering entirely. The wrapper also gets a
+        `hyperpony-version` attribute, which hyperpony.js sends back with polls
+        (`hx-trigger="every ..."`) targeting the element. If it still matches the
+        version of the requested path and query, the request is answered with
+        `unchanged_status` and `HX-Reswap: none` without rendering.
+        """
+        return None
 
     def get_attrs(self) -> dict[str, str]:
         return {**super().get_attrs(), **(self.attrs or {})}
 
+    @classmethod
+    def get_element_markup(cls) -> ElementMarkup:
+        markup = cls.__dict__.get("__hyperpony_element_markup", None)
+        if markup is None:
+            markup = ElementMarkup.compile(cls.tag, cls.hx_target, cls.hx_swap, cls.attrs or {})
+            setattr(cls, "__hyperpony_element_markup", markup)
+        return markup
+
     def dispatch(self, request, *args, **kwargs):
-        response = super().dispatch(request, *args, **kwargs)  # type: ignore
-        return ElementResponse.wrap(
+        version_key = self.get_version_key()
+        version = self._get_version(request, version_key) if version_key is not None else None
+        response = self._dispatch_element(request, version, *args, **kwargs)
+        client_version = request.headers.get(VERSION_HEADER)
+        changed = (
+            client_version != version
+            if version is not None and client_version is not None
+            else None
+        )
+        if self.polling_policy is not None and _is_conditional_request(request):
+            apply_polling_policy(request, response, self.polling_policy, changed)
+        return response
+
+    def _dispatch_element(self, request, version: Optional[str], *args, **kwargs):
+        name = self.__class__.__name__
+        etag = None
+        if version is not None and _is_conditional_request(request):
+            if request.headers.get(VERSION_HEADER) == version:
+                if is_metrics_enabled():
+                    element_not_modified.inc((name, "version_header"))
+                return self._get_unchanged_response()
+            etag = quote_etag(_hash(f"{version}|{request.get_full_path()}".encode()))
+            not_modified = _get_not_modified_response(request, etag)
+            if not_modified is not None:
+                if is_metrics_enabled():
+                    element_not_modified.inc((name, "version_key"))
+                return not_modified
+
+        start = time.perf_counter()
+        with start_span(
+            "hyperpony.view", {ATTR_ELEMENT_ID: self.get_element_id(), ATTR_ELEMENT_CLASS: name}
+        ):
+            response = super().dispatch(request, *args, **kwargs)  # type: ignore
+        markup = self.get_element_markup()
+        attrs = self.get_attrs()
+        if version is not None:
+            attrs = {**attrs, VERSION_ATTRIBUTE: version}
+        response = ElementResponse.wrap(
             response,
             ElementMeta(
                 element_id=self.get_element_id(),
                 tag=self.tag,
                 hx_target=self.hx_target,
                 hx_swap=self.hx_swap,
-                attrs=self.get_attrs(),
+                attrs=attrs,
+                # as_view() initkwargs may override the class-level values
+                markup=markup
+                if self.tag == markup.tag
+                and self.hx_target == markup.hx_target
+                and self.hx_swap == markup.hx_swap
+                and (self.attrs or {}) == markup.attrs
+                else None,
+                name=name,
+                # set by ClientStateMixin
+                client_state_bytes=getattr(self, "client_state_bytes", 0),
             ),
         )
+        meta = get_element_meta(response)
+        if meta is not None:
+            self._check_byte_budget(meta)
+        if is_metrics_enabled():
+            element_renders.inc((name,))
+            element_render_seconds.observe((name,), time.perf_counter() - start)
+            if meta is not None:
+                if meta.inner_bytes is not None:
+                    element_bytes.inc((name, "inner"), meta.inner_bytes)
+                element_bytes.inc((name, "wrapper"), meta.wrapper_bytes)
+        if etag is not None:
+            return _set_etag(response, etag) if _is_etag_stable(request, response) else response
+        if self.use_etag and _is_conditional_request(request):
+            return self._get_content_etag_response(request, response)
+        return response
+
+    def _get_version(self, request: HttpRequest, version_key: str) -> str:
+        # not get_full_path(), embedded requests share the query string of the page
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        key = f"{self.__class__.__qualname__}|{self.get_element_id()}|{request.path}?{query}"
+        return _hash(f"{key}|{version_key}".encode())
+
+    def _get_unchanged_response(self) -> HttpResponse:
+        return reswap(HttpResponse(status=self.unchanged_status), "none")
+
+    def _get_content_etag_response(
+        self, request: HttpRequest, response: HttpResponseBase
+    ) -> HttpResponseBase:
+        if (
+            not isinstance(response, HttpResponse)
+            or response.has_header("ETag")
+            or not _is_etag_stable(request, response)
+        ):
+            return response
+        _set_etag(response, quote_etag(_hash(response.content)))
+        conditional = get_conditional_response(request, etag=response["ETag"], response=response)
+        if conditional is not response and is_metrics_enabled():
+            element_not_modified.inc((self.__class__.__name__, "content"))
+        return conditional
+
+    def _check_byte_budget(self, meta: ElementMeta):
+        budget = self.byte_budget
+        if budget is None:
+            budget = getattr(settings, "HYPERPONY_ELEMENT_BYTE_BUDGET", None)
+        if budget is None or meta.inner_bytes is None:
+            return
+        size = meta.inner_bytes + meta.wrapper_bytes
+        if size > budget:
+            logger.warning(
+                "%s exceeded its byte budget (%d bytes > %d bytes: inner %d, wrapper %d, "
+                "client state %d)",
+                self.__class__.__name__,
+                size,
+                budget,
+                meta.inner_bytes,
+                meta.wrapper_bytes,
+                meta.client_state_bytes,
+            )
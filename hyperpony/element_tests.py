@@ -1,14 +1,17 @@
+import asyncio
+
 import django
 import lxml.html
 
 
-from django.http import HttpResponse, HttpResponseBase
-from django.test import RequestFactory
+from django.http import HttpResponse, HttpResponseBase, StreamingHttpResponse
+from django.test import RequestFactory, override_settings
 from django.views import View
 from django.views.generic import TemplateView
 
 from hyperpony import ElementMixin
-from hyperpony.element import ElementMeta, ElementResponse
+from hyperpony.element import ElementMeta, ElementResponse, get_element_meta
+from hyperpony.response_handler import add_response_handler
 from hyperpony.utils import response_to_str
 
 
@@ -104,3 +107,263 @@ def test_element_return_template_http_response(rf: RequestFactory):
     c = response_to_str(TView.as_view()(rf.get("/")))
     assert "<div id='TView' hx-target='this' hx-swap='outerHTML'  hyperpony-element>" in c
     assert "bar" in c
+
+
+def test_element_wrap_surrounds_content_chunks():
+    response = HttpResponse("ä")
+    response.write("ö")
+    inner = list(response)
+
+    wrapped = ElementResponse.wrap(response, ElementMeta(element_id="chunks"))
+    chunks = list(wrapped)
+    assert chunks[1:-1] == inner
+    assert chunks[1] is inner[0]
+    assert chunks[-1] == b"</div>"
+    assert response_to_str(wrapped).endswith(">äö</div>")
+    _assert_element_values(wrapped, element_id="chunks")
+
+
+def test_element_wrap_streaming_response(rf: RequestFactory):
+    class TView(ElementMixin, View):
+        def get(self, request, *args, **kwargs):
+            return StreamingHttpResponse(f"<p>{i}</p>" for i in range(3))
+
+    response = TView.as_view()(rf.get("/"))
+    assert response.streaming
+    chunks = list(response.streaming_content)
+    assert chunks[0].startswith(b"<div id='TView'")
+    assert chunks[1:-1] == [b"<p>0</p>", b"<p>1</p>", b"<p>2</p>"]
+    assert chunks[-1] == b"</div>"
+
+
+def test_element_wrap_async_streaming_response():
+    async def content():
+        for i in range(3):
+            yield f"<p>{i}</p>"
+
+    async def consume(response):
+        return [chunk async for chunk in response.streaming_content]
+
+    response = ElementResponse.wrap(
+        StreamingHttpResponse(content()), ElementMeta(element_id="stream")
+    )
+    chunks = asyncio.run(consume(response))
+    assert chunks[0].startswith(b"<div id='stream'")
+    assert chunks[1:] == [b"<p>0</p>", b"<p>1</p>", b"<p>2</p>", b"</div>"]
+
+
+def test_element_streaming_response_to_str():
+    response = ElementResponse.wrap(
+        StreamingHttpResponse(["a", "b"]), ElementMeta(element_id="stream")
+    )
+    _assert_element_values(response, element_id="stream")
+
+
+def test_element_markup_is_compiled_once_per_class(rf: RequestFactory):
+    class TView(ElementMixin, View):
+        attrs = {"class": "bar"}
+
+        def get(self, request, *args, **kwargs):
+            return HttpResponse("")
+
+    class TViewSub(TView):
+        attrs = {"class": "baz"}
+
+    markup = TView.get_element_markup()
+    TView.as_view()(rf.get("/"))
+    assert TView.get_element_markup() is markup
+    assert TViewSub.get_element_markup() is not markup
+    assert 'class="baz"' in response_to_str(TViewSub.as_view()(rf.get("/")))
+
+
+def test_element_markup_with_dynamic_attrs(rf: RequestFactory):
+    class TView(ElementMixin, View):
+        attrs = {"class": "bar"}
+
+        def get_attrs(self):
+            return {**super().get_attrs(), "data-request": self.request.GET["r"]}
+
+        def get(self, request, *args, **kwargs):
+            return HttpResponse("")
+
+    for r in ("1", "2"):
+        content = response_to_str(TView.as_view()(rf.get("/", {"r": r})))
+        meta = ElementMeta(element_id="TView", attrs={"class": "bar", "data-request": r})
+        assert content == meta.tags()[0] + "</div>"
+        _assert_element_values(TView.as_view()(rf.get("/", {"r": r})))
+
+
+def test_element_markup_initkwargs_override(rf: RequestFactory):
+    class TView(ElementMixin, View):
+        def get(self, request, *args, **kwargs):
+            return HttpResponse("")
+
+    res = TView.as_view(tag="span", attrs={"class": "x"})(rf.get("/"))
+    _assert_element_values(res, tag="span")
+    assert 'class="x"' in response_to_str(res)
+
+
+def test_element_response_is_not_proxied(rf: RequestFactory):
+    class TView(ElementMixin, View):
+        def get(self, request, *args, **kwargs):
+            return HttpResponse("")
+
+    res = TView.as_view()(rf.get("/"))
+    assert type(res) is HttpResponse
+    assert isinstance(res, ElementResponse)
+    meta = get_element_meta(res)
+    assert meta is not None and meta.element_id == "TView"
+    assert not isinstance(HttpResponse(), ElementResponse)
+
+    marked = HttpResponse()
+    assert ElementResponse(marked) is marked
+    assert isinstance(marked, ElementResponse)
+
+
+def test_element_byte_accounting(rf: RequestFactory):
+    class TView(ElementMixin, View):
+        def get(self, request, *args, **kwargs):
+            return HttpResponse("1234567890")
+
+    response = TView.as_view()(rf.get("/"))
+    meta = get_element_meta(response)
+    assert meta is not None
+    assert meta.inner_bytes == 10
+    assert meta.inner_bytes + meta.wrapper_bytes == len(response.content)
+    assert meta.client_state_bytes == 0
+
+
+@override_settings(HYPERPONY_ELEMENT_BYTE_BUDGET=10)
+def test_element_byte_budget_warning(rf: RequestFactory, caplog):
+    class TView(ElementMixin, View):
+        def get(self, request, *args, **kwargs):
+            return HttpResponse("1234567890")
+
+    class TViewLargeBudget(TView):
+        byte_budget = 1000
+
+    with caplog.at_level("WARNING", logger="hyperpony.element"):
+        TViewLargeBudget.as_view()(rf.get("/"))
+        assert caplog.records == []
+        TView.as_view()(rf.get("/"))
+
+    [record] = caplog.records
+    assert "TView exceeded its byte budget" in record.getMessage()
+
+
+def test_element_version_key_skips_rendering(rf: RequestFactory):
+    renders = []
+
+    class TView(ElementMixin, View):
+        def get_version_key(self):
+            return "v1"
+
+        def get(self, request, *args, **kwargs):
+            renders.append(1)
+            return HttpResponse("content")
+
+    response = TView.as_view()(rf.get("/"))
+    etag = response["ETag"]
+    assert response.status_code == 200
+    assert response["Cache-Control"] == "private, no-cache"
+
+    not_modified = TView.as_view()(rf.get("/", HTTP_IF_NONE_MATCH=etag))
+    assert not_modified.status_code == 304
+    assert not_modified["ETag"] == etag
+    assert len(renders) == 1
+
+    other_path = TView.as_view()(rf.get("/?page=2", HTTP_IF_NONE_MATCH=etag))
+    assert other_path.status_code == 200
+    assert len(renders) == 2
+
+
+def test_element_content_etag(rf: RequestFactory):
+    content = "a"
+
+    class TView(ElementMixin, View):
+        use_etag = True
+
+        def get(self, request, *args, **kwargs):
+            return HttpResponse(content)
+
+        post = get
+
+    response = TView.as_view()(rf.get("/"))
+    etag = response["ETag"]
+    assert TView.as_view()(rf.get("/", HTTP_IF_NONE_MATCH=etag)).status_code == 304
+    assert TView.as_view()(rf.post("/", HTTP_IF_NONE_MATCH=etag)).status_code == 200
+
+    content = "b"
+    changed = TView.as_view()(rf.get("/", HTTP_IF_NONE_MATCH=etag))
+    assert changed.status_code == 200
+    assert changed["ETag"] != etag
+
+
+def test_element_content_etag_skipped_for_response_handlers(rf: RequestFactory):
+    class TView(ElementMixin, View):
+        use_etag = True
+
+        def get(self, request, *args, **kwargs):
+            add_response_handler(request, lambda response: None)
+            return HttpResponse("content")
+
+    response = TView.as_view()(rf.get("/"))
+    assert response.status_code == 200
+    assert not response.has_header("ETag")
+
+
+def test_element_version_header_unchanged_response(rf: RequestFactory):
+    version = "v1"
+    renders = []
+
+    class TView(ElementMixin, View):
+        def get_version_key(self):
+            return version
+
+        def get(self, request, *args, **kwargs):
+            renders.append(1)
+            return HttpResponse("content")
+
+    class TViewStopPolling(TView):
+        unchanged_status = 286
+
+    def get_version(view) -> str:
+        parsed: lxml.html.HtmlElement = lxml.html.fromstring(response_to_str(view(rf.get("/"))))
+        return parsed.attrib["hyperpony-version"]
+
+    current = get_version(TView.as_view())
+
+    unchanged = TView.as_view()(rf.get("/", HTTP_X_HYPERPONY_VERSION=current))
+    assert unchanged.status_code == 204
+    assert unchanged["HX-Reswap"] == "none"
+    assert unchanged.content == b""
+    assert len(renders) == 1
+
+    other_page = TView.as_view()(rf.get("/?page=2", HTTP_X_HYPERPONY_VERSION=current))
+    assert other_page.status_code == 200
+    assert len(renders) == 2
+
+    stop_polling = TViewStopPolling.as_view()
+    stopped = stop_polling(rf.get("/", HTTP_X_HYPERPONY_VERSION=get_version(stop_polling)))
+    assert stopped.status_code == 286
+    assert len(renders) == 3
+
+    version = "v2"
+    changed = TView.as_view()(rf.get("/", HTTP_X_HYPERPONY_VERSION=current))
+    assert changed.status_code == 200
+    assert len(renders) == 4
+    assert get_version(TView.as_view()) != current
+
+
+def test_element_version_etag_skipped_for_response_handlers(rf: RequestFactory):
+    class TView(ElementMixin, View):
+        def get_version_key(self):
+            return "v1"
+
+        def get(self, request, *args, **kwargs):
+            add_response_handler(request, lambda response: None)
+            return HttpResponse("content")
+
+    response = TView.as_view()(rf.get("/"))
+    assert response.status_code == 200
+    assert not response.has_header("ETag")
@@ -0,0 +1,119 @@
+import logging
+import time
+from contextlib import contextmanager, ExitStack
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest
+
+from hyperpony.context import get_hyperpony_context
+
+
+logger = logging.getLogger("hyperpony.guardrails")
+
+DEFAULT_EMBED_LIMITS: dict[str, Any] = {
+    "max_depth": 32,
+    "max_embeds": None,
+    "max_time": None,
+    "max_queries": None,
+    "action": "raise",
+}
+
+
+class EmbedLimitError(Exception):
+    """
+    Raised if an embed tree exceeds one of the limits configured in
+    `HYPERPONY_EMBED_LIMITS`. `chain` lists the view classes from the outermost
+    embed to the offending one.
+    """
+
+    def __init__(self, limit: str, value: Any, maximum: Any, chain: list[str]):
+        super().__init__(
+            f"Embed limit '{limit}' exceeded ({value} > {maximum}): {' -> '.join(chain)}"
+        )
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+        self.chain = chain
+
+
+def get_embed_limits() -> dict[str, Any]:
+    return {**DEFAULT_EMBED_LIMITS, **getattr(settings, "HYPERPONY_EMBED_LIMITS", {})}
+
+
+class EmbedGuard:
+    """
+    Tracks the embed stack and the accumulated cost of a request tree.
+    """
+
+    def __init__(self, limits: dict[str, Any]):
+        self.limits = limits
+        self.stack: list[str] = []
+        self.embeds = 0
+        self.time = 0.0
+        self.top_level_start = 0.0
+        self.queries = 0
+        self.reported: set[str] = set()
+
+    def render_time(self) -> float:
+        """
+        Cumulative render time of all top-level embeds, including the running one.
+        """
+        running = time.perf_counter() - self.top_level_start if self.stack else 0.0
+        return self.time + running
+
+    def check(self, limit: str, value: Any, name: Optional[str] = None):
+        maximum = self.limits.get(limit)
+        if maximum is None or value <= maximum:
+            return
+
+        chain = [*self.stack] if name is None else [*self.stack, name]
+        error = EmbedLimitError(limit, value, maximum, chain)
+        if self.limits["action"] == "raise":
+            raise error
+        if limit not in self.reported:
+            # only report the first violation of each limit per request tree
+            self.reported.add(limit)
+            logger.error(str(error))
+
+
+def get_embed_guard(request: HttpRequest) -> EmbedGuard:
+    context = get_hyperpony_context(request)
+    if context.embed_guard is None:
+        context.embed_guard = EmbedGuard(get_embed_limits())
+    return context.embed_guard
+
+
+@contextmanager
+def guard_embed(request: HttpRequest, view_class: type) -> Iterator[None]:
+    guard = get_embed_guard(request)
+    name = view_class.__name__
+
+    guard.embeds += 1
+    guard.check("max_depth", len(guard.stack) + 1, name)
+    guard.check("max_embeds", guard.embeds, name)
+    guard.check("max_time", guard.render_time(), name)
+
+    top_level = len(guard.stack) == 0
+    if top_level:
+        guard.top_level_start = time.perf_counter()
+    guard.stack.append(name)
+    try:
+        if not top_level or guard.limits["max_queries"] is None:
+            yield
+            return
+
+        def count_query(execute, sql, params, many, context):
+            guard.queries += 1
+            guard.check("max_queries", guard.queries)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            yield
+    finally:
+        guard.stack.pop()
+        if top_level:
+            guard.time += time.perf_counter() - guard.top_level_start
@@ -0,0 +1,87 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+
+from hyperpony import SingletonPathMixin
+from hyperpony.guardrails import EmbedLimitError
+from main.models import AppUser
+
+
+class RecursiveView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(RecursiveProxyView.embed(request))
+
+
+class RecursiveProxyView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(RecursiveView.embed(request))
+
+
+class RowView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        AppUser.objects.count()
+        return HttpResponse("row")
+
+
+class ListView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse("".join(RowView.embed(request) for _ in range(10)))
+
+
+urlpatterns = [
+    RecursiveView.create_path(),
+    RecursiveProxyView.create_path(),
+    RowView.create_path(),
+    ListView.create_path(),
+]
+
+
+@pytest.mark.urls("hyperpony.guardrails_tests")
+@override_settings(HYPERPONY_EMBED_LIMITS={"max_depth": 5})
+def test_max_depth_lists_chain(rf: RequestFactory):
+    with pytest.raises(EmbedLimitError) as e:
+        RecursiveView.embed(rf.get("/"))
+
+    assert e.value.limit == "max_depth"
+    assert e.value.chain == [
+        "RecursiveView",
+        "RecursiveProxyView",
+        "RecursiveView",
+        "RecursiveProxyView",
+        "RecursiveView",
+        "RecursiveProxyView",
+    ]
+    assert "RecursiveView -> RecursiveProxyView -> RecursiveView" in str(e.value)
+
+
+@pytest.mark.urls("hyperpony.guardrails_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_EMBED_LIMITS={"max_embeds": 5})
+def test_max_embeds(rf: RequestFactory):
+    with pytest.raises(EmbedLimitError) as e:
+        ListView.embed(rf.get("/"))
+    assert e.value.limit == "max_embeds"
+    assert e.value.chain == ["ListView", "RowView"]
+
+
+@pytest.mark.urls("hyperpony.guardrails_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_EMBED_LIMITS={"max_queries": 3})
+def test_max_queries(rf: RequestFactory):
+    with pytest.raises(EmbedLimitError) as e:
+        ListView.embed(rf.get("/"))
+    assert e.value.limit == "max_queries"
+    assert e.value.value == 4
+
+
+@pytest.mark.urls("hyperpony.guardrails_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_EMBED_LIMITS={"max_embeds": 5, "action": "log"})
+def test_log_action(rf: RequestFactory, caplog):
+    with caplog.at_level("ERROR", logger="hyperpony.guardrails"):
+        content = ListView.embed(rf.get("/"))
+
+    assert content.count("row") == 10
+    assert len(caplog.records) == 1
+    assert "ListView -> RowView" in caplog.records[0].getMessage()
@@ -1,11 +1,53 @@
-from typing import cast, Any
+from typing import cast, Any, Optional, Union
 
 import lxml.html
-from django.http import HttpResponse
+from django.http import HttpRequest, HttpResponse
 from django_htmx.http import reswap as htmx_reswap
 from django_htmx.http import retarget as htmx_retarget
 
-from hyperpony.utils import is_response_processable, response_to_str
+from hyperpony.element import get_element_meta
+from hyperpony.metrics import element_bytes, is_metrics_enabled, oob_swaps
+from hyperpony.utils import is_response_processable, render_response, response_to_str
+
+
+# swaps that replace the target, only the last fragment per target has an effect
+_REPLACING_SWAPS = ("outerHTML", "innerHTML")
+
+
+class SwapOobCollector:
+    """
+    Collects the OOB fragments of a response. A later replacing fragment (outerHTML,
+    innerHTML) for the same target id replaces the earlier one, keeping the position of
+    the first. Additive fragments (e.g. beforeend) are all kept. The fragments are
+    joined once when the response is enriched.
+    """
+
+    def __init__(self):
+        self.fragments: dict[Union[str, int], bytes] = {}
+
+    def add(self, target_id: str, fragment: bytes, hx_swap: str = "outerHTML"):
+        key: Union[str, int] = target_id
+        if hx_swap.split(" ", 1)[0] not in _REPLACING_SWAPS:
+            # unique, the existing int keys are smaller than the number of fragments
+            key = len(self.fragments)
+        self.fragments[key] = fragment
+
+    def __len__(self) -> int:
+        return len(self.fragments)
+
+    def nbytes(self) -> int:
+        return sum(len(f) for f in self.fragments.values())
+
+    def join(self) -> bytes:
+        return b"".join(self.fragments.values())
+
+
+def get_swap_oob_collector(response: HttpResponse) -> SwapOobCollector:
+    collector = getattr(response, "_hyperpony_swap_oob", None)
+    if collector is None:
+        collector = SwapOobCollector()
+        setattr(response, "_hyperpony_swap_oob", collector)
+    return collector
 
 
 def swap_oob(
@@ -19,22 +61,62 @@ def swap_oob(
     if not isinstance(additional, list):
         additional = [additional]
 
+    collector = get_swap_oob_collector(response)
+    metrics = is_metrics_enabled()
     for a in additional:
-        oob_content = response_to_str(a).strip()
-        parsed: lxml.html.Element = lxml.html.fromstring(oob_content)
-        id = parsed.attrib.get("id")
-        if id is None:
-            raise Exception(
-                f"The additional response {a} does not contain exactly one element with an id attribute."
-            )
+        oob = _element_swap_oob_content(a, hx_swap)
+        if oob is None:
+            oob = _parse_swap_oob_content(a, hx_swap)
+        collector.add(*oob, hx_swap)
+        if metrics:
+            meta = get_element_meta(a)
+            name = (meta.name if meta is not None else None) or "-"
+            oob_swaps.inc((name,))
+            element_bytes.inc((name, "oob"), len(oob[1]))
 
-        parsed.attrib["hx-swap-oob"] = f"{hx_swap}:#{id}"
-        oob_wrapped = lxml.html.tostring(parsed)
+    return response
 
-        hyperpony_swap_oob = getattr(response, "_hyperpony_swap_oob", [])
-        setattr(response, "_hyperpony_swap_oob", hyperpony_swap_oob + [oob_wrapped])
 
-    return response
+def _element_swap_oob_content(response: HttpResponse, hx_swap: str) -> Optional[tuple[str, bytes]]:
+    """
+    Adds the hx-swap-oob attribute to the opening tag of an element response,
+    using the element's metadata instead of parsing the content.
+    """
+    meta = get_element_meta(response)
+    if meta is None or meta.nowrap or meta.element_id is None:
+        return None
+    if not is_response_processable(response, "text/html"):
+        return None
+
+    render_response(response)
+    content = response.content
+    head = f"<{meta.tag} ".encode(response.charset)
+    if not content.startswith(head):
+        return None
+
+    attr = f"hx-swap-oob='{hx_swap}:#{meta.element_id}' ".encode(response.charset)
+    return meta.element_id, head + attr + content[len(head) :]
+
+
+def _parse_swap_oob_content(response: HttpResponse, hx_swap: str) -> tuple[str, bytes]:
+    oob_content = response_to_str(response).strip()
+    parsed: lxml.html.Element = lxml.html.fromstring(oob_content)
+    id = parsed.attrib.get("id")
+    if id is None:
+        raise Exception(
+            f"The additional response {response} does not contain exactly one element with an id attribute."
+        )
+
+    parsed.attrib["hx-swap-oob"] = f"{hx_swap}:#{id}"
+    return id, lxml.html.tostring(parsed)
+
+
+def is_htmx_request(request: HttpRequest) -> bool:
+    htmx = getattr(request, "htmx", None)
+    if htmx is not None:
+        return bool(htmx)
+    # HtmxMiddleware not installed
+    return request.headers.get("HX-Request") == "true"
 
 
 def swap_body(response: HttpResponse) -> HttpResponse:
@@ -44,10 +126,10 @@ def swap_body(response: HttpResponse) -> HttpResponse:
 
 
 def enrich_response_with_oob_contents(response: HttpResponse):
+    collector: Optional[SwapOobCollector] = getattr(response, "_hyperpony_swap_oob", None)
+    if collector is None or len(collector) == 0:
+        return
     if is_response_processable(response, "text/html"):
-        content = response_to_str(response)
-        bcontent = bytes(content, "UTF-8")
-        hyperpony_swap_oob = getattr(response, "_hyperpony_swap_oob", [])
-        for oob in hyperpony_swap_oob:
-            bcontent += oob
-        response.content = bcontent
+        render_response(response)
+        # appended as a single chunk, the response's content is not copied
+        response.write(collector.join())
@@ -1,5 +1,6 @@
 import dataclasses
 import inspect
+import time
 import uuid
 from dataclasses import dataclass
 from types import UnionType
@@ -19,10 +20,14 @@ from typing import (
 )
 
 import orjson
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.http import HttpRequest, HttpResponse, QueryDict
 
+from hyperpony.context import get_hyperpony_context
+from hyperpony.metrics import is_metrics_enabled, model_loads, param_resolution_seconds
+from hyperpony.tracing import ATTR_VIEW_CLASS, start_span
 from hyperpony.utils import _get_request_from_args, is_none_compatible
 from hyperpony.views import EmbeddedRequest
 
@@ -110,8 +115,8 @@ class InjectParamsMixin:
     #         if v.default is not _REQUIRED:
     #             setattr(self, k, v.default)
 
-    def __process_hyperpony_params(self) -> dict[str, "QueryParam"]:
-        cls = self.__class__
+    @classmethod
+    def __process_hyperpony_params(cls) -> dict[str, "QueryParam"]:
         if hasattr(cls, "__hyperpony_params"):
             return getattr(cls, "__hyperpony_params")
 
@@ -132,21 +137,58 @@ class InjectParamsMixin:
         return params
 
     def setup(self, request, *args, **kwargs):
+        start = time.perf_counter()
         hyperpony_params = self.__process_hyperpony_params()
-        for k, v in hyperpony_params.items():
-            # do not process QueryParam if view instance overrides field
-            if hasattr(self, k) and not isinstance(getattr(self, k), QueryParam):
+        with start_span("hyperpony.params", {ATTR_VIEW_CLASS: self.__class__.__name__}):
+            for k, v in hyperpony_params.items():
+                # do not process QueryParam if view instance overrides field
+                if hasattr(self, k) and not isinstance(getattr(self, k), QueryParam):
+                    continue
+
+                try:
+                    value = v.get_value([request], kwargs)
+                except KeyError:
+                    raise Exception(
+                        f"No value found for non-optional parameter '{self.__class__.__name__}.{v.query_param_name}'"
+                    )
+                setattr(self, k, value)
+
+        if len(hyperpony_params) > 0 and is_metrics_enabled():
+            param_resolution_seconds.observe(
+                (self.__class__.__name__,), time.perf_counter() - start
+            )
+        return super().setup(request, *args, **kwargs)  # type: ignore
+
+    @classmethod
+    def preload_params(cls, kwargs_list: list[dict[str, Any]]):
+        """
+        Replaces the primary keys of model parameters in `kwargs_list` with the
+        model instances. All instances of a parameter are loaded with a single query.
+        Used by `embed_batch()`.
+        """
+        for qp in cls.__process_hyperpony_params().values():
+            if qp.model_loader is not None or get_origin(qp.target_type) is list:
+                continue
+            model_type = check_and_return_model_type(qp.target_type)
+            if model_type is None:
                 continue
 
-            try:
-                value = v.get_value([request], kwargs)
-            except KeyError:
-                raise Exception(
-                    f"No value found for non-optional parameter '{self.__class__.__name__}.{v.query_param_name}'"
-                )
-            setattr(self, k, value)
+            name = cast(str, qp.query_param_name)
+            pks = {
+                kwargs[name]
+                for kwargs in kwargs_list
+                if kwargs.get(name) is not None and not isinstance(kwargs[name], models.Model)
+            }
+            if len(pks) == 0:
+                continue
 
-        return super().setup(request, *args, **kwargs)  # type: ignore
+            instances = {str(pk): obj for pk, obj in model_type.objects.in_bulk(pks).items()}
+            if is_metrics_enabled():
+                model_loads.inc((model_type.__name__,), len(instances))
+            for kwargs in kwargs_list:
+                instance = instances.get(str(kwargs.get(name)))
+                if instance is not None:
+                    kwargs[name] = instance
 
 
 @dataclass
@@ -245,10 +287,10 @@ class QueryParam(InjectedParam):
                 ct == "application/x-www-form-urlencoded"
                 and self.parse_content_type_form_urlencoded
             ):
-                formqd = QueryDict(request.body, encoding=request.encoding)
+                formqd = _parse_body(request)
                 source.update({name: formqd.getlist(name) for name in formqd})
             elif ct == "application/json" and self.parse_content_type_json:
-                data = orjson.loads(request.body)
+                data = _parse_body(request)
                 source.update({k: [v] for k, v in data.items()})
 
         # Order matters! GET overrides POST
@@ -288,7 +330,12 @@ class QueryParam(InjectedParam):
             else:
                 raise KeyError()
 
-        return _convert_value_to_type(self, values, self.target_type, is_optional)
+        identity_map = (
+            get_hyperpony_context(request).identity_map
+            if getattr(settings, "HYPERPONY_IDENTITY_MAP", False)
+            else None
+        )
+        return _convert_value_to_type(self, values, self.target_type, is_optional, identity_map)
 
 
 T = TypeVar("T")
@@ -341,14 +388,37 @@ class ObjectDoesNotExistWithPk(ObjectDoesNotExist):
         self.pk = pk
 
 
-def _convert_value_to_type(qp: QueryParam, values: list[Any], target_type: type, is_optional: bool):
+def _parse_body(request: HttpRequest) -> Any:
+    """
+    Parses the form or JSON body of the request. The result is shared by all parameters
+    of all views of the request tree. Embedded requests do not have a body.
+    """
+    parsed_bodies = get_hyperpony_context(request).parsed_bodies
+    ct = request.content_type
+    if ct not in parsed_bodies:
+        if ct == "application/json":
+            parsed_bodies[ct] = orjson.loads(request.body)
+        else:
+            parsed_bodies[ct] = QueryDict(request.body, encoding=request.encoding)
+    return parsed_bodies[ct]
+
+
+def _convert_value_to_type(
+    qp: QueryParam,
+    values: list[Any],
+    target_type: type,
+    is_optional: bool,
+    identity_map: Optional[dict[tuple[type, str], Any]] = None,
+):
     # List type
     if get_origin(target_type) is list:
         list_type = get_args(target_type)[0]
-        return [_convert_value_to_type(qp, [v], list_type, is_optional) for v in values]
+        return [
+            _convert_value_to_type(qp, [v], list_type, is_optional, identity_map) for v in values
+        ]
 
     if target_type is list:
-        return [_convert_value_to_type(qp, [v], str, is_optional) for v in values]
+        return [_convert_value_to_type(qp, [v], str, is_optional, identity_map) for v in values]
 
     # Scalar types
     value = values[0]
@@ -362,7 +432,16 @@ def _convert_value_to_type(qp: QueryParam, values: list[Any], target_type: type,
             try:
                 if qp.model_loader is not None:
                     return qp.model_loader(value)
-                return model_type.objects.get(pk=value)
+                # instances are shared by the views of the request tree's render phase
+                key = (model_type, str(value))
+                if identity_map is not None and key in identity_map:
+                    return identity_map[key]
+                instance = model_type.objects.get(pk=value)
+                if is_metrics_enabled():
+                    model_loads.inc((model_type.__name__,))
+                if identity_map is not None:
+                    identity_map[key] = instance
+                return instance
             except model_type.DoesNotExist as e:
                 if is_optional:
                     return None
@@ -5,17 +5,18 @@ import orjson.orjson
 import pytest
 from django.core.exceptions import ObjectDoesNotExist
 from django.http import HttpResponse
-from django.test import RequestFactory
-from django.urls import path
+from django.test import RequestFactory, override_settings
+from django.urls import path, resolve
 from django.views import View
 from django.views.generic import TemplateView
 from pytest_mock import MockerFixture
 
-from hyperpony import param
+from hyperpony import param, SingletonPathMixin
 from hyperpony.inject_params import InjectParamsMixin, ObjectDoesNotExistWithPk
+from hyperpony.middleware import HyperponyMiddleware
 from hyperpony.testutils import view_from_response
 from hyperpony.utils import response_to_str
-from hyperpony.views import invoke_view, embed_view
+from hyperpony.views import invoke_view, embed_view, embed_view_batch
 from main.models import AppUser
 
 
@@ -65,7 +66,24 @@ class TViewModelLoaderFn(InjectParamsMixin, ViewWithSelfInResponse):
     p1: AppUser = param(model_loader=lambda v: AppUser(id=v, username=f"created_{v}"))
 
 
+class TViewUserRow(SingletonPathMixin, InjectParamsMixin, View):
+    user: AppUser = param()
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(f"<div id='row'>{self.user.username}</div>")
+
+
+class TViewRenameUser(InjectParamsMixin, View):
+    user: AppUser = param()
+
+    def post(self, request, *args, **kwargs):
+        AppUser.objects.filter(pk=self.user.pk).update(username="renamed")
+        TViewUserRow.swap_oob(request, kwargs={"user": self.user.pk})
+        return HttpResponse("<div>saved</div>")
+
+
 urlpatterns = [
+    TViewUserRow.create_path("<uuid:user>"),
     path("tviewp1/", TViewP1.as_view(), name="tviewp1"),
     path("tview_origins/<str:p_path>", TViewOrigins.as_view(p_kwargs="ddd"), name="tview-origins"),
     path("tview_model/", TViewModel.as_view(), name="tview-model"),
@@ -396,6 +414,22 @@ def test_inject_params_type_conversion_model_with_pk_as_route_param(
     spy.assert_called_once_with(pk=app_user.id)
 
 
+@pytest.mark.django_db
+@pytest.mark.urls("hyperpony.inject_params_tests")
+@override_settings(HYPERPONY_IDENTITY_MAP=True)
+def test_inject_params_model_loaded_once_per_request_tree(
+    rf: RequestFactory, mocker: MockerFixture
+):
+    app_user = AppUser.objects.create(username="testuser")
+    spy = mocker.spy(AppUser.objects, "get")
+
+    request = rf.get("/")
+    first = embed_view(request, "tview-model-route-param", kwargs=dict(user=app_user.id))
+    second = embed_view(request, "tview-model-route-param", kwargs=dict(user=app_user.id))
+    assert first == second
+    spy.assert_called_once_with(pk=app_user.id)
+
+
 @pytest.mark.django_db
 @pytest.mark.urls("hyperpony.inject_params_tests")
 def test_inject_params_type_conversion_model_with_instance_as_route_param(
@@ -510,3 +544,50 @@ def test_type_conversion_model_wrong_id_optional(rf: RequestFactory):
 #     untyped_viewfn = typing.cast(Any, viewfn)
 #     untyped_viewfn(rf.get("/"))
 #
+
+
+@pytest.mark.django_db
+@pytest.mark.urls("hyperpony.inject_params_tests")
+def test_inject_params_embed_batch_loads_models_with_one_query(
+    rf: RequestFactory, django_assert_num_queries
+):
+    users = [AppUser.objects.create(username=f"user{i}") for i in range(5)]
+    kwargs_list = [dict(user=u.id) for u in users] + [dict(user=users[0])]
+
+    with django_assert_num_queries(1):
+        fragments = embed_view_batch(rf.get("/"), "tview-model-route-param", kwargs_list)
+
+    assert fragments == [f"{u.id} {u.username}" for u in [*users, users[0]]]
+
+
+@pytest.mark.django_db
+@pytest.mark.urls("hyperpony.inject_params_tests")
+def test_inject_params_embed_batch_resolves_once(rf: RequestFactory, monkeypatch):
+    users = [AppUser.objects.create(username=f"user{i}") for i in range(5)]
+    resolved = []
+
+    def counting_resolve(url):
+        resolved.append(url)
+        return resolve(url)
+
+    monkeypatch.setattr("hyperpony.views.resolve", counting_resolve)
+    fragments = embed_view_batch(
+        rf.get("/"), "tview-model-route-param", [dict(user=u) for u in users]
+    )
+
+    assert fragments == [f"{u.id} {u.username}" for u in users]
+    assert len(resolved) == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.urls("hyperpony.inject_params_tests")
+@override_settings(HYPERPONY_IDENTITY_MAP=True)
+def test_inject_params_deferred_swap_oob_sees_updates(rf: RequestFactory):
+    app_user = AppUser.objects.create(username="old")
+    request = rf.post("/", {"user": str(app_user.pk)}, HTTP_HX_REQUEST="true")
+
+    response = HyperponyMiddleware(TViewRenameUser.as_view())(request)
+
+    content = response.content.decode()
+    assert content.startswith("<div>saved</div>")
+    assert ">renamed</div>" in content
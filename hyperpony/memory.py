@@ -0,0 +1,188 @@
+import linecache
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+import orjson
+from django.conf import settings
+from django.http import HttpRequest, HttpResponseBase
+
+from hyperpony.context import find_hyperpony_context, get_hyperpony_context
+
+
+logger = logging.getLogger("hyperpony.memory")
+
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+]
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+def is_memory_profiler_enabled() -> bool:
+    return getattr(settings, "HYPERPONY_MEMORY_PROFILER", False)
+
+
+def _acquire_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(getattr(settings, "HYPERPONY_MEMORY_PROFILER_FRAMES", 1))
+            _started_tracing = True
+        _tracing_users += 1
+
+
+def _release_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_FILTERS)
+
+
+def _site(stat: tracemalloc.StatisticDiff) -> str:
+    frame = stat.traceback[0]
+    line = linecache.getline(frame.filename, frame.lineno).strip()
+    return f"{frame.filename}:{frame.lineno} {line}".strip()
+
+
+@dataclass()
+class MemoryNode:
+    """
+    Memory usage of a single embed or response handler. `net` and `peak` are relative
+    to the memory in use when the node started and include nested nodes.
+    """
+
+    kind: str
+    name: str
+    start: int
+    peak: int
+    end: int = 0
+    top_sites: list[tuple[str, int]] = field(default_factory=list)
+    snapshot: Optional[tracemalloc.Snapshot] = field(default=None, repr=False)
+
+    @property
+    def net(self) -> int:
+        return self.end - self.start
+
+    @property
+    def peak_delta(self) -> int:
+        return self.peak - self.start
+
+
+class MemoryProfile:
+    """
+    Tracks the memory of a request tree with `tracemalloc`. Tracing is process-wide,
+    allocations of concurrent requests are included in the numbers.
+    """
+
+    def __init__(self, top: int):
+        self.top = top
+        self.nodes: list[MemoryNode] = []
+        self.stack: list[MemoryNode] = []
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self.start = current
+        self.peak = current
+
+    def _flush_peak(self):
+        _, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            self.stack[-1].peak = max(self.stack[-1].peak, peak)
+        self.peak = max(self.peak, peak)
+        tracemalloc.reset_peak()
+
+    def enter(self, kind: str, name: str) -> MemoryNode:
+        self._flush_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        node = MemoryNode(kind=kind, name=name, start=current, peak=current)
+        if self.top > 0:
+            node.snapshot = _take_snapshot()
+        self.stack.append(node)
+        return node
+
+    def exit(self, node: MemoryNode):
+        self._flush_peak()
+        self.stack.pop()
+        node.end, _ = tracemalloc.get_traced_memory()
+        if self.stack:
+            self.stack[-1].peak = max(self.stack[-1].peak, node.peak)
+        if node.snapshot is not None:
+            stats = _take_snapshot().compare_to(node.snapshot, "lineno")
+            node.top_sites = [(_site(s), s.size_diff) for s in stats[: self.top] if s.size_diff]
+            node.snapshot = None
+        self.nodes.append(node)
+
+    def report(self) -> dict[str, Any]:
+        """
+        Aggregates the nodes per element class and response handler. Peaks are the
+        maximum, net allocations and allocation sites the sum over all nodes.
+        """
+        self._flush_peak()
+        groups: dict[str, dict[str, Any]] = {}
+        sites: dict[str, Counter[str]] = {}
+        for node in self.nodes:
+            key = f"{node.kind}:{node.name}"
+            group = groups.setdefault(key, {"count": 0, "peak_bytes": 0, "net_bytes": 0})
+            group["count"] += 1
+            group["peak_bytes"] = max(group["peak_bytes"], node.peak_delta)
+            group["net_bytes"] += node.net
+            for site, size in node.top_sites:
+                sites.setdefault(key, Counter())[site] += size
+        for key, counter in sites.items():
+            groups[key]["top_sites"] = [
+                {"site": site, "size_bytes": size} for site, size in counter.most_common(self.top)
+            ]
+        return {"peak_bytes": self.peak - self.start, "groups": groups}
+
+
+def start_request_memory_profile(request: HttpRequest) -> MemoryProfile:
+    _acquire_tracing()
+    profile = MemoryProfile(getattr(settings, "HYPERPONY_MEMORY_PROFILER_TOP", 10))
+    get_hyperpony_context(request).memory_profile = profile
+    return profile
+
+
+def get_request_memory_profile(request: HttpRequest) -> Optional[MemoryProfile]:
+    context = find_hyperpony_context(request)
+    return context.memory_profile if context is not None else None
+
+
+@contextmanager
+def trace_memory(request: HttpRequest, kind: str, name: str) -> Iterator[Optional[MemoryNode]]:
+    """
+    Adds a node for the allocations of the `with` block to the request's memory
+    profile. Yields None without `HYPERPONY_MEMORY_PROFILER`.
+    """
+    profile = get_request_memory_profile(request)
+    if profile is None:
+        yield None
+        return
+    node = profile.enter(kind, name)
+    try:
+        yield node
+    finally:
+        profile.exit(node)
+
+
+def finish_request_memory_profile(request: HttpRequest, response: Optional[HttpResponseBase]):
+    profile = get_request_memory_profile(request)
+    if profile is None:
+        return
+    try:
+        logger.info(orjson.dumps({"path": request.path, **profile.report()}).decode())
+    finally:
+        _release_tracing()
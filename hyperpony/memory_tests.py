@@ -0,0 +1,83 @@
+import tracemalloc
+
+import orjson
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+
+from hyperpony import SingletonPathMixin
+from hyperpony.memory import get_request_memory_profile
+from hyperpony.middleware import HyperponyMiddleware
+from hyperpony.response_handler import add_response_handler
+
+
+_kept: list[bytearray] = []
+
+
+class AllocatingView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        transient = bytearray(2_000_000)
+        _kept.append(bytearray(500_000))
+        return HttpResponse(f"{len(transient)}")
+
+
+urlpatterns = [
+    AllocatingView.create_path(),
+]
+
+
+def _page(request):
+    def copy_handler(response):
+        response.copy = bytes(1_000_000)
+
+    add_response_handler(request, copy_handler)
+    return HttpResponse(AllocatingView.embed(request))
+
+
+@pytest.mark.urls("hyperpony.memory_tests")
+@override_settings(HYPERPONY_MEMORY_PROFILER=True, HYPERPONY_MEMORY_PROFILER_TOP=3)
+def test_memory_profile_per_element_and_handler(rf: RequestFactory, caplog):
+    request = rf.get("/")
+    with caplog.at_level("INFO", logger="hyperpony.memory"):
+        HyperponyMiddleware(_page)(request)
+
+    assert not tracemalloc.is_tracing()
+    profile = get_request_memory_profile(request)
+    assert profile is not None
+
+    report = orjson.loads(caplog.records[0].getMessage())
+    assert report["path"] == "/"
+    assert report["peak_bytes"] >= 2_500_000
+
+    element = report["groups"]["embed:AllocatingView"]
+    assert element["count"] == 1
+    assert element["peak_bytes"] >= 2_500_000
+    assert 500_000 <= element["net_bytes"] < 1_000_000
+    assert any("bytearray(500_000)" in s["site"] for s in element["top_sites"])
+
+    handler = report["groups"]["handler:_page.<locals>.copy_handler"]
+    assert handler["peak_bytes"] >= 1_000_000
+    assert any("bytes(1_000_000)" in s["site"] for s in handler["top_sites"])
+
+
+@pytest.mark.urls("hyperpony.memory_tests")
+@override_settings(HYPERPONY_MEMORY_PROFILER=False)
+def test_memory_profiler_disabled(rf: RequestFactory):
+    request = rf.get("/")
+    HyperponyMiddleware(_page)(request)
+    assert get_request_memory_profile(request) is None
+
+
+@override_settings(HYPERPONY_MEMORY_PROFILER=True)
+def test_memory_profiler_stops_tracing_if_response_processing_fails(rf: RequestFactory):
+    def failing_handler(response):
+        raise ValueError("handler failed")
+
+    def page(request):
+        add_response_handler(request, failing_handler)
+        return HttpResponse("")
+
+    with pytest.raises(ValueError, match="handler failed"):
+        HyperponyMiddleware(page)(rf.get("/"))
+    assert not tracemalloc.is_tracing()
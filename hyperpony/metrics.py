@@ -0,0 +1,204 @@
+import bisect
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def is_metrics_enabled() -> bool:
+    return getattr(settings, "HYPERPONY_METRICS", False)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple[str, ...] = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self) -> dict[tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values().items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # per label set: non-cumulative bucket counts (+Inf last), sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple[str, ...], value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def values(self) -> dict[tuple[str, ...], tuple[list[int], float]]:
+        with self._lock:
+            return {k: ([*counts], total[0]) for k, (counts, total) in self._values.items()}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.values().items()):
+            cumulative = 0
+            bounds = [*(_format_value(b) for b in self.buckets), "+Inf"]
+            for le, count in zip(bounds, counts):
+                cumulative += count
+                label_str = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of metrics. Each metric guards its values with its own
+    lock, so metrics can be updated from any thread.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[Counter | Histogram]:
+        return self._metrics.get(name)
+
+    def reset(self):
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def expose(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+element_renders = registry.counter(
+    "hyperpony_element_renders_total", "Number of element renders.", ("element",)
+)
+element_render_seconds = registry.histogram(
+    "hyperpony_element_render_seconds", "Element render time in seconds.", ("element",)
+)
+param_resolution_seconds = registry.histogram(
+    "hyperpony_param_resolution_seconds",
+    "Time spent resolving the parameters of a view in seconds.",
+    ("view",),
+)
+model_loads = registry.counter(
+    "hyperpony_model_loads_total", "Number of model instances loaded by parameters.", ("model",)
+)
+oob_swaps = registry.counter(
+    "hyperpony_oob_swaps_total", "Number of fragments added as OOB swap.", ("element",)
+)
+client_state_bytes = registry.counter(
+    "hyperpony_client_state_bytes_total",
+    "Bytes of client state received from and sent to the browser.",
+    ("element", "direction"),
+)
+element_bytes = registry.counter(
+    "hyperpony_element_bytes_total",
+    "Bytes contributed by elements. The part is inner, wrapper (including the client "
+    "state, see hyperpony_client_state_bytes_total) or oob.",
+    ("element", "part"),
+)
+element_not_modified = registry.counter(
+    "hyperpony_element_not_modified_total",
+    "Number of element GETs answered without rendering or content. The source is "
+    "version_header, version_key or content.",
+    ("element", "source"),
+)
+element_shed = registry.counter(
+    "hyperpony_element_shed_total",
+    "Number of element requests not served because the server was over capacity.",
+    ("element",),
+)
+render_budget_fallbacks = registry.counter(
+    "hyperpony_render_budget_fallbacks_total",
+    "Number of embeds replaced by a placeholder because the render budget was spent.",
+    ("element",),
+)
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Prometheus scrape endpoint. The metrics name views and show traffic, keep the URL
+    internal.
+    """
+    return HttpResponse(registry.expose(), content_type="text/plain; version=0.0.4; charset=utf-8")
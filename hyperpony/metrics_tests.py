@@ -0,0 +1,102 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+
+from hyperpony import ElementMixin, SingletonPathMixin, param
+from hyperpony.htmx import swap_oob
+from hyperpony.inject_params import InjectParamsMixin
+from hyperpony.metrics import (
+    MetricsRegistry,
+    element_bytes,
+    element_render_seconds,
+    element_renders,
+    metrics_view,
+    model_loads,
+    oob_swaps,
+    param_resolution_seconds,
+    registry,
+)
+from main.models import AppUser
+
+
+class MetricsElement(SingletonPathMixin, InjectParamsMixin, ElementMixin, View):
+    user: AppUser = param()
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(self.user.username)
+
+
+urlpatterns = [
+    MetricsElement.create_path(),
+]
+
+
+@pytest.fixture(autouse=True)
+def _reset_registry():
+    registry.reset()
+
+
+def test_registry_exposes_prometheus_text():
+    r = MetricsRegistry()
+    counter = r.counter("c_total", "A counter.", ("element",))
+    histogram = r.histogram("h_seconds", "A histogram.", ("element",), buckets=(0.1, 1.0))
+    counter.inc(('E"1',), 2)
+    histogram.observe(("E",), 0.5)
+    histogram.observe(("E",), 5)
+
+    assert r.expose().splitlines() == [
+        "# HELP c_total A counter.",
+        "# TYPE c_total counter",
+        'c_total{element="E\\"1"} 2',
+        "# HELP h_seconds A histogram.",
+        "# TYPE h_seconds histogram",
+        'h_seconds_bucket{element="E",le="0.1"} 0',
+        'h_seconds_bucket{element="E",le="1"} 1',
+        'h_seconds_bucket{element="E",le="+Inf"} 2',
+        'h_seconds_sum{element="E"} 5.5',
+        'h_seconds_count{element="E"} 2',
+    ]
+
+
+def test_registry_rejects_duplicate_names():
+    r = MetricsRegistry()
+    r.counter("c_total", "A counter.")
+    with pytest.raises(ValueError):
+        r.counter("c_total", "A counter.")
+
+
+@pytest.mark.urls("hyperpony.metrics_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_METRICS=True, HYPERPONY_IDENTITY_MAP=True)
+def test_element_metrics(rf: RequestFactory):
+    user = AppUser.objects.create(username="metrics")
+    request = rf.get("/")
+    content = MetricsElement.embed(request, GET={"user": str(user.pk)})
+    swap_oob(HttpResponse("main"), MetricsElement.invoke(request, GET={"user": str(user.pk)}))
+
+    assert element_renders.values() == {("MetricsElement",): 2}
+    assert sum(element_render_seconds.values()[("MetricsElement",)][0]) == 2
+    assert sum(param_resolution_seconds.values()[("MetricsElement",)][0]) == 2
+    # the second render uses the request's identity map
+    assert model_loads.values() == {("AppUser",): 1}
+    assert oob_swaps.values() == {("MetricsElement",): 1}
+    assert element_bytes.values() == {
+        ("MetricsElement", "inner"): 2 * len("metrics"),
+        ("MetricsElement", "wrapper"): 2 * (len(content) - len("metrics")),
+        ("MetricsElement", "oob"): len(content) + len(" hx-swap-oob='outerHTML:#MetricsElement'"),
+    }
+
+    exposed = metrics_view(rf.get("/metrics"))
+    assert exposed["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert 'hyperpony_element_renders_total{element="MetricsElement"} 2' in exposed.content.decode()
+
+
+@pytest.mark.urls("hyperpony.metrics_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_METRICS=False)
+def test_metrics_disabled(rf: RequestFactory):
+    user = AppUser.objects.create(username="metrics")
+    MetricsElement.embed(rf.get("/"), GET={"user": str(user.pk)})
+    assert element_renders.values() == {}
+    assert model_loads.values() == {}
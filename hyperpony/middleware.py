@@ -1,24 +1,141 @@
 from asyncio import iscoroutinefunction
+from contextlib import ExitStack
+from typing import Optional
 
+from django.http import HttpRequest, HttpResponseBase
 from django.utils.decorators import sync_and_async_middleware
 
-from hyperpony.response_handler import process_response
+from hyperpony.context import get_hyperpony_context
+from hyperpony.deadlines import get_request_render_budget, start_request_deadline
+from hyperpony.memory import (
+    finish_request_memory_profile,
+    is_memory_profiler_enabled,
+    start_request_memory_profile,
+)
+from hyperpony.polling import (
+    finish_request_pressure,
+    is_server_pressure_enabled,
+    start_request_pressure,
+)
+from hyperpony.profiler import finish_request_profile, is_profiler_enabled, start_request_profile
+from hyperpony.queries import is_query_inspector_enabled, report_request_queries
+from hyperpony.response_handler import aprocess_response, process_response
+from hyperpony.shedding import get_load_shedding_capacity, get_shed_response
+from hyperpony.stack_profiler import (
+    finish_request_stack_profile,
+    get_request_profiling_settings,
+    RequestStackProfile,
+    start_request_stack_profile,
+)
+
+
+class _RequestFeatures:
+    """
+    The request features enabled in the settings, read once when the middleware is
+    created. Requests without features only create the context and process the response.
+    """
+
+    def __init__(self):
+        self.pressure = is_server_pressure_enabled()
+        self.shedding = get_load_shedding_capacity() is not None
+        self.profiler = is_profiler_enabled()
+        self.render_budget = get_request_render_budget()
+        self.memory_profiler = is_memory_profiler_enabled()
+        self.stack_profiling = get_request_profiling_settings()
+        self.stack_profiler = self.stack_profiling is not None
+        self.query_inspector = is_query_inspector_enabled()
+        self.teardown = (
+            self.pressure
+            or self.profiler
+            or self.memory_profiler
+            or self.stack_profiler
+            or self.query_inspector
+        )
+        self.enabled = self.teardown or self.shedding or self.render_budget is not None
+
+    def start(self, request: HttpRequest, all_threads: bool) -> Optional[RequestStackProfile]:
+        if self.profiler:
+            start_request_profile(request)
+        if self.render_budget is not None:
+            start_request_deadline(request, self.render_budget)
+        if self.memory_profiler:
+            start_request_memory_profile(request)
+        if self.stack_profiling is not None:
+            return start_request_stack_profile(request, self.stack_profiling, all_threads)
+        return None
+
+    def finish(
+        self,
+        request: HttpRequest,
+        response: Optional[HttpResponseBase],
+        stack_profile: Optional[RequestStackProfile],
+        pressure: Optional[float],
+    ):
+        if not self.teardown:
+            return
+        # each teardown runs, also if the request or an earlier teardown failed
+        with ExitStack() as teardown:
+            if self.pressure:
+                teardown.callback(finish_request_pressure, pressure)
+            if self.profiler:
+                teardown.callback(finish_request_profile, request, response)
+            if self.query_inspector:
+                teardown.callback(report_request_queries, request)
+            if self.memory_profiler:
+                teardown.callback(finish_request_memory_profile, request, response)
+            if self.stack_profiler:
+                teardown.callback(finish_request_stack_profile, stack_profile, response)
 
 
 @sync_and_async_middleware
 def HyperponyMiddleware(get_response):  # noqa: N802
+    features = _RequestFeatures()
+
     if iscoroutinefunction(get_response):
 
         async def middleware(request):
-            response = await get_response(request)
-            response = process_response(request, response)
-            return response
+            if not features.enabled:
+                get_hyperpony_context(request)
+                return await aprocess_response(request, await get_response(request))
+
+            pressure = start_request_pressure() if features.pressure else None
+            stack_profile = None
+            response = None
+            try:
+                if features.shedding:
+                    response = get_shed_response(request)
+                    if response is not None:
+                        return response
+                get_hyperpony_context(request)
+                # sync views run in other threads, so all threads are sampled
+                stack_profile = features.start(request, all_threads=True)
+                response = await get_response(request)
+                response = await aprocess_response(request, response)
+                return response
+            finally:
+                features.finish(request, response, stack_profile, pressure)
 
     else:
 
         def middleware(request):
-            response = get_response(request)
-            response = process_response(request, response)
-            return response
+            if not features.enabled:
+                get_hyperpony_context(request)
+                return process_response(request, get_response(request))
+
+            pressure = start_request_pressure() if features.pressure else None
+            stack_profile = None
+            response = None
+            try:
+                if features.shedding:
+                    response = get_shed_response(request)
+                    if response is not None:
+                        return response
+                get_hyperpony_context(request)
+                stack_profile = features.start(request, all_threads=False)
+                response = get_response(request)
+                response = process_response(request, response)
+                return response
+            finally:
+                features.finish(request, response, stack_profile, pressure)
 
     return middleware
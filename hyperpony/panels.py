@@ -0,0 +1,37 @@
+from debug_toolbar.panels import Panel
+
+from hyperpony.profiler import get_request_profile
+
+
+class EmbedTreePanel(Panel):
+    """
+    django-debug-toolbar panel that shows the embed tree recorded by the Hyperpony
+    profiler. Requires `HYPERPONY_PROFILER = True` and the `HyperponyMiddleware`.
+
+    Add `"hyperpony.panels.EmbedTreePanel"` to `DEBUG_TOOLBAR_PANELS` to enable it.
+    """
+
+    title = "Hyperpony"
+    template = "hyperpony/panels/embed_tree.html"
+
+    @property
+    def nav_subtitle(self):
+        stats = self.get_stats()
+        if not stats.get("nodes"):
+            return ""
+        root = stats["nodes"][0]
+        return f"{len(stats['nodes']) - 1} embeds in {root['duration_ms']:.1f} ms"
+
+    def generate_stats(self, request, response):
+        profile = get_request_profile(request)
+        if profile is None:
+            self.record_stats({"nodes": []})
+            return
+
+        nodes = []
+        for node in profile.root.walk():
+            data = node.to_dict()
+            del data["children"]
+            data["indent"] = node.depth * 16
+            nodes.append(data)
+        self.record_stats({"nodes": nodes})
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponseBase
+
+
+POLL_INTERVAL_HEADER = "X-Hyperpony-Poll-Interval"
+
+
+def is_server_pressure_enabled() -> bool:
+    # load shedding relies on the in-flight requests
+    return (
+        getattr(settings, "HYPERPONY_SERVER_PRESSURE", False)
+        or getattr(settings, "HYPERPONY_LOAD_SHEDDING_MAX_IN_FLIGHT", None) is not None
+    )
+
+
+class ServerPressure:
+    """
+    In-flight requests and the latencies of the most recent requests of this process.
+    Tracked by the middleware if `HYPERPONY_SERVER_PRESSURE` or load shedding is enabled.
+    """
+
+    def __init__(self, window: int = 256):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.latencies: deque[float] = deque(maxlen=window)
+
+    def start(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def finish(self, duration: float):
+        with self.lock:
+            self.in_flight -= 1
+            self.latencies.append(duration)
+
+    def p95(self) -> Optional[float]:
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def reset(self):
+        with self.lock:
+            self.in_flight = 0
+            self.latencies.clear()
+
+
+server_pressure = ServerPressure()
+
+
+def start_request_pressure() -> float:
+    server_pressure.start()
+    return time.perf_counter()
+
+
+def finish_request_pressure(start: Optional[float]):
+    if start is None:
+        return
+    server_pressure.finish(time.perf_counter() - start)
+
+
+@dataclass(frozen=True)
+class PollingPolicy:
+    """
+    Computes the polling interval of an element in seconds.
+
+    Polls that report the element unchanged (see `ElementMixin.get_version_key()`)
+    multiply the interval by `backoff`, changes reset it to `min_interval`. The result
+    is scaled by the server pressure: the ratio of in-flight requests to
+    `max_in_flight` and of the recent p95 latency to `target_p95`, whichever is larger.
+    """
+
+    min_interval: float = 2.0
+    max_interval: float = 60.0
+    backoff: float = 1.5
+    max_in_flight: Optional[int] = None
+    target_p95: Optional[float] = 0.5
+
+    def pressure_factor(self, pressure: ServerPressure) -> float:
+        factor = 1.0
+        if self.max_in_flight is not None:
+            factor = max(factor, pressure.in_flight / self.max_in_flight)
+        if self.target_p95 is not None:
+            p95 = pressure.p95()
+            if p95 is not None:
+                factor = max(factor, p95 / self.target_p95)
+        return factor
+
+    def next_interval(
+        self, current: Optional[float], changed: Optional[bool], pressure: ServerPressure
+    ) -> float:
+        """
+        `changed` is None if the element does not declare a version.
+        """
+        if changed is False and current is not None:
+            interval = current * self.backoff
+        else:
+            interval = self.min_interval
+        interval *= self.pressure_factor(pressure)
+        return min(self.max_interval, max(self.min_interval, interval))
+
+
+def _parse_interval(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def apply_polling_policy(
+    request: HttpRequest, response: HttpResponseBase, policy: PollingPolicy, changed: Optional[bool]
+):
+    """
+    Sends the next polling interval to hyperpony.js, which sends the current interval
+    with every polling request.
+    """
+    current = _parse_interval(request.headers.get(POLL_INTERVAL_HEADER))
+    if current is None:
+        return
+    interval = policy.next_interval(current, changed, server_pressure)
+    response[POLL_INTERVAL_HEADER] = f"{interval:.1f}"
@@ -0,0 +1,99 @@
+import lxml.html
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+
+from hyperpony import ElementMixin
+from hyperpony.middleware import HyperponyMiddleware
+from hyperpony.polling import POLL_INTERVAL_HEADER, PollingPolicy, ServerPressure, server_pressure
+from hyperpony.utils import response_to_str
+
+
+@pytest.fixture(autouse=True)
+def _reset_server_pressure():
+    server_pressure.reset()
+    yield
+    server_pressure.reset()
+
+
+def test_polling_policy_backs_off_while_unchanged():
+    policy = PollingPolicy(min_interval=2, max_interval=10, backoff=2)
+    pressure = ServerPressure()
+    assert policy.next_interval(2, False, pressure) == 4
+    assert policy.next_interval(8, False, pressure) == 10
+    assert policy.next_interval(8, True, pressure) == 2
+    assert policy.next_interval(8, None, pressure) == 2
+    assert policy.next_interval(None, False, pressure) == 2
+
+
+def test_polling_policy_scales_with_server_pressure():
+    policy = PollingPolicy(min_interval=2, max_interval=60, max_in_flight=4, target_p95=0.1)
+    pressure = ServerPressure()
+    for _ in range(12):
+        pressure.start()
+    assert policy.next_interval(2, True, pressure) == 6
+
+    for _ in range(12):
+        pressure.finish(0.5)
+    assert pressure.in_flight == 0
+    assert policy.next_interval(2, True, pressure) == 10
+
+
+class PolledView(ElementMixin, View):
+    polling_policy = PollingPolicy(min_interval=2, max_interval=60, backoff=2)
+    version = "v1"
+
+    def get_version_key(self):
+        return self.version
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse("content")
+
+
+def test_element_sends_next_poll_interval(rf: RequestFactory):
+    view = PolledView.as_view()
+    rendered: lxml.html.HtmlElement = lxml.html.fromstring(response_to_str(view(rf.get("/"))))
+    version = rendered.attrib["hyperpony-version"]
+
+    unchanged = view(
+        rf.get("/", HTTP_X_HYPERPONY_VERSION=version, HTTP_X_HYPERPONY_POLL_INTERVAL="4")
+    )
+    assert unchanged.status_code == 204
+    assert unchanged[POLL_INTERVAL_HEADER] == "8.0"
+
+    changed = view(rf.get("/", HTTP_X_HYPERPONY_VERSION="old", HTTP_X_HYPERPONY_POLL_INTERVAL="4"))
+    assert changed.status_code == 200
+    assert changed[POLL_INTERVAL_HEADER] == "2.0"
+
+    other_page = view(rf.get("/?page=2", HTTP_X_HYPERPONY_VERSION=version))
+    assert other_page.status_code == 200
+    assert POLL_INTERVAL_HEADER not in other_page
+
+
+@override_settings(HYPERPONY_SERVER_PRESSURE=True)
+def test_middleware_tracks_server_pressure(rf: RequestFactory):
+    in_flight = []
+
+    def view(request):
+        in_flight.append(server_pressure.in_flight)
+        return HttpResponse("")
+
+    HyperponyMiddleware(view)(rf.get("/"))
+    assert in_flight == [1]
+    assert server_pressure.in_flight == 0
+    assert len(server_pressure.latencies) == 1
+
+
+@override_settings(HYPERPONY_SERVER_PRESSURE=False)
+def test_server_pressure_disabled(rf: RequestFactory):
+    HyperponyMiddleware(lambda request: HttpResponse(""))(rf.get("/"))
+    assert len(server_pressure.latencies) == 0
+
+
+def test_middleware_reads_settings_when_created(rf: RequestFactory):
+    with override_settings(HYPERPONY_SERVER_PRESSURE=True):
+        middleware = HyperponyMiddleware(lambda request: HttpResponse(""))
+    with override_settings(HYPERPONY_SERVER_PRESSURE=False):
+        middleware(rf.get("/"))
+    assert len(server_pressure.latencies) == 1
@@ -0,0 +1,205 @@
+import logging
+import time
+from contextlib import contextmanager, ExitStack
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+import orjson
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse, HttpResponseBase
+from django.template.response import SimpleTemplateResponse
+
+from hyperpony.context import find_hyperpony_context, get_hyperpony_context
+from hyperpony.element import get_element_meta
+from hyperpony.utils import response_content_length
+
+
+logger = logging.getLogger("hyperpony.profiler")
+
+
+def is_profiler_enabled() -> bool:
+    return getattr(settings, "HYPERPONY_PROFILER", False)
+
+
+@dataclass()
+class EmbedNode:
+    """
+    A single `invoke_view()`, `embed()` or `swap_oob()` call. Query counts and times
+    include the queries of all nested nodes.
+    """
+
+    kind: str
+    name: str
+    path_name: Optional[str] = None
+    depth: int = 0
+    duration: float = 0.0
+    queries: int = 0
+    query_time: float = 0.0
+    response_bytes: Optional[int] = None
+    inner_bytes: Optional[int] = None
+    wrapper_bytes: Optional[int] = None
+    client_state_bytes: Optional[int] = None
+    oob_bytes: Optional[int] = None
+    children: list["EmbedNode"] = field(default_factory=list)
+
+    def walk(self) -> Iterator["EmbedNode"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "path_name": self.path_name,
+            "depth": self.depth,
+            "duration_ms": round(self.duration * 1000, 3),
+            "queries": self.queries,
+            "query_time_ms": round(self.query_time * 1000, 3),
+            "response_bytes": self.response_bytes,
+            "inner_bytes": self.inner_bytes,
+            "wrapper_bytes": self.wrapper_bytes,
+            "client_state_bytes": self.client_state_bytes,
+            "oob_bytes": self.oob_bytes,
+            "children": [c.to_dict() for c in self.children],
+        }
+
+
+class EmbedProfile:
+    """
+    The embed tree of a single request. The root node represents the request itself,
+    its query counts are the sum of its embeds. Queries of the page view outside of
+    embeds are not counted.
+    """
+
+    def __init__(self, request: HttpRequest):
+        self.root = EmbedNode(kind="request", name=request.path)
+        self.stack: list[EmbedNode] = [self.root]
+        self._start = time.perf_counter()
+
+    def finish(self):
+        self.root.duration = time.perf_counter() - self._start
+        self.root.queries = sum(c.queries for c in self.root.children)
+        self.root.query_time = sum(c.query_time for c in self.root.children)
+
+    @property
+    def embed_count(self) -> int:
+        return sum(1 for _ in self.root.walk()) - 1
+
+    def to_dict(self) -> dict[str, Any]:
+        return self.root.to_dict()
+
+
+def start_request_profile(request: HttpRequest) -> EmbedProfile:
+    profile = EmbedProfile(request)
+    get_hyperpony_context(request).profile = profile
+    return profile
+
+
+def get_request_profile(request: HttpRequest) -> Optional[EmbedProfile]:
+    context = find_hyperpony_context(request)
+    return context.profile if context is not None else None
+
+
+@contextmanager
+def profile_embed(
+    request: HttpRequest, kind: str, name: str, path_name: Optional[str]
+) -> Iterator[Optional[EmbedNode]]:
+    """
+    Records an embed node for the duration of the `with` block. The caller may set
+    `response_bytes` on the yielded node, which is None without `HYPERPONY_PROFILER`.
+    """
+    profile = get_request_profile(request)
+    if profile is None:
+        yield None
+        return
+
+    parent = profile.stack[-1]
+    node = EmbedNode(kind=kind, name=name, path_name=path_name, depth=parent.depth + 1)
+    parent.children.append(node)
+    profile.stack.append(node)
+
+    def count_query(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            node.queries += 1
+            node.query_time += time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            yield node
+    finally:
+        node.duration = time.perf_counter() - start
+        profile.stack.pop()
+
+
+def get_response_bytes(response: HttpResponseBase) -> Optional[int]:
+    if not isinstance(response, HttpResponse) or response.streaming:
+        return None
+    if isinstance(response, SimpleTemplateResponse) and not response.is_rendered:
+        return None
+    return response_content_length(response)
+
+
+def record_response_bytes(node: EmbedNode, response: HttpResponseBase):
+    """
+    Sets the size of the response and, for element responses, the bytes of its inner
+    content, wrapper tags and client state attributes.
+    """
+    node.response_bytes = get_response_bytes(response)
+    meta = get_element_meta(response)
+    if meta is not None and not meta.nowrap:
+        node.inner_bytes = meta.inner_bytes
+        node.wrapper_bytes = meta.wrapper_bytes
+        node.client_state_bytes = meta.client_state_bytes
+    collector = getattr(response, "_hyperpony_swap_oob", None)
+    if collector is not None:
+        node.oob_bytes = collector.nbytes()
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def server_timing_header(profile: EmbedProfile) -> str:
+    max_entries = getattr(settings, "HYPERPONY_PROFILER_SERVER_TIMING_MAX_ENTRIES", 50)
+    root = profile.root
+    entries = [
+        f"hyperpony;dur={root.duration * 1000:.1f};"
+        f"desc={_quote(f'{profile.embed_count} embeds, {root.queries} embed queries')}"
+    ]
+    for i, node in enumerate(list(root.walk())[1 : max_entries + 1]):
+        desc = f"{'.' * node.depth}{node.kind} {node.name} q={node.queries}"
+        if node.response_bytes is not None:
+            desc += f" b={node.response_bytes}"
+        entries.append(f"hp{i + 1};dur={node.duration * 1000:.1f};desc={_quote(desc)}")
+    return ", ".join(entries)
+
+
+def finish_request_profile(request: HttpRequest, response: Optional[HttpResponseBase]):
+    """
+    Adds the Server-Timing header and logs slow requests. A failed request has no
+    response and is only logged.
+    """
+    profile = get_request_profile(request)
+    if profile is None:
+        return
+
+    profile.finish()
+    if response is not None:
+        record_response_bytes(profile.root, response)
+
+    if response is not None and getattr(settings, "HYPERPONY_PROFILER_SERVER_TIMING", True):
+        existing = response.headers.get("Server-Timing")
+        header = server_timing_header(profile)
+        response.headers["Server-Timing"] = f"{existing}, {header}" if existing else header
+
+    threshold = getattr(settings, "HYPERPONY_PROFILER_LOG_THRESHOLD_MS", None)
+    if threshold is not None and profile.root.duration * 1000 >= threshold:
+        logger.warning(orjson.dumps(profile.to_dict()).decode())
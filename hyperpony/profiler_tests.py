@@ -0,0 +1,115 @@
+import orjson
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+
+from hyperpony import HyperponyElementMixin, SingletonPathMixin
+from hyperpony.client_state import client_state
+from hyperpony.middleware import HyperponyMiddleware
+from hyperpony.profiler import get_request_profile
+from main.models import AppUser
+
+
+class ProfLeafView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        AppUser.objects.count()
+        return HttpResponse("leaf")
+
+
+class ProfParentView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(f"parent {ProfLeafView.embed(request)} {ProfLeafView.embed(request)}")
+
+
+class ProfStateElement(SingletonPathMixin, HyperponyElementMixin, View):
+    counter: int = client_state(0)
+
+    def get(self, request, *args, **kwargs):
+        self.add_swap_oob(HttpResponse("<p id='oob'>oob</p>"))
+        return HttpResponse("state")
+
+
+urlpatterns = [
+    ProfLeafView.create_path(),
+    ProfParentView.create_path(),
+    ProfStateElement.create_path(),
+]
+
+
+def _page(request):
+    # not part of an embed
+    AppUser.objects.count()
+    return HttpResponse(f"<body>{ProfParentView.embed(request)}</body>")
+
+
+@pytest.mark.urls("hyperpony.profiler_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_PROFILER=True)
+def test_profiler_records_embed_tree(rf: RequestFactory):
+    request = rf.get("/")
+    response = HyperponyMiddleware(_page)(request)
+
+    profile = get_request_profile(request)
+    assert profile is not None
+    assert profile.embed_count == 3
+
+    parent = profile.root.children[0]
+    assert parent.kind == "embed"
+    assert parent.name == "ProfParentView"
+    assert parent.depth == 1
+    assert parent.queries == 2
+    assert [c.name for c in parent.children] == ["ProfLeafView", "ProfLeafView"]
+    assert all(c.depth == 2 and c.queries == 1 for c in parent.children)
+    assert parent.children[0].response_bytes == 4
+    assert profile.root.queries == 2
+
+    server_timing = response["Server-Timing"]
+    assert server_timing.startswith("hyperpony;dur=")
+    assert 'desc="3 embeds, 2 embed queries"' in server_timing
+    assert "hp1;dur=" in server_timing
+    assert "..embed ProfLeafView q=1 b=4" in server_timing
+
+
+@pytest.mark.urls("hyperpony.profiler_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_PROFILER=False)
+def test_profiler_disabled(rf: RequestFactory):
+    request = rf.get("/")
+    response = HyperponyMiddleware(_page)(request)
+    assert get_request_profile(request) is None
+    assert "Server-Timing" not in response
+
+
+@pytest.mark.urls("hyperpony.profiler_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_PROFILER=True, HYPERPONY_PROFILER_LOG_THRESHOLD_MS=0)
+def test_profiler_logs_json_over_threshold(rf: RequestFactory, caplog):
+    with caplog.at_level("WARNING", logger="hyperpony.profiler"):
+        HyperponyMiddleware(_page)(rf.get("/"))
+
+    tree = orjson.loads(caplog.records[0].getMessage())
+    assert tree["kind"] == "request"
+    assert tree["children"][0]["name"] == "ProfParentView"
+    assert len(tree["children"][0]["children"]) == 2
+
+
+@pytest.mark.urls("hyperpony.profiler_tests")
+@override_settings(HYPERPONY_PROFILER=True)
+def test_profiler_records_element_bytes(rf: RequestFactory):
+    request = rf.get("/")
+    response = HyperponyMiddleware(lambda r: HttpResponse(ProfStateElement.embed(r)))(request)
+
+    profile = get_request_profile(request)
+    assert profile is not None
+    node = profile.root.children[0]
+    assert node.inner_bytes == len("state")
+    assert node.wrapper_bytes is not None
+    assert node.client_state_bytes is not None
+    assert node.response_bytes == node.inner_bytes + node.wrapper_bytes
+    assert 0 < node.client_state_bytes < node.wrapper_bytes
+    assert node.oob_bytes is None
+
+    root = profile.root
+    assert root.oob_bytes == len(b'<p id="oob" hx-swap-oob="outerHTML:#oob">oob</p>')
+    assert root.response_bytes == len(response.content)
@@ -0,0 +1,188 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager, ExitStack
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest
+
+from hyperpony.context import find_hyperpony_context, get_hyperpony_context
+
+
+logger = logging.getLogger("hyperpony.queries")
+
+# query logs of all requests started while a capture is active, see testutils
+_captures: list[list["QueryLog"]] = []
+
+
+def is_query_inspector_enabled() -> bool:
+    return getattr(settings, "HYPERPONY_QUERY_INSPECTOR", False)
+
+
+@dataclass()
+class QueryRecord:
+    sql: str
+    params: str
+    element: str
+    chain: tuple[str, ...]
+    embed_index: int
+    duration: float
+
+
+@dataclass()
+class QueryPattern:
+    """
+    A query that was executed repeatedly. `elements` counts the executions per
+    element class.
+    """
+
+    sql: str
+    count: int
+    elements: Counter[str] = field(default_factory=Counter)
+
+    def __str__(self) -> str:
+        by_element = ", ".join(f"{name} x{count}" for name, count in self.elements.most_common())
+        return f"{self.count}x {self.sql} ({by_element})"
+
+
+class QueryLog:
+    """
+    The queries of a request tree, each attributed to the element on top of the embed
+    stack when it was executed.
+    """
+
+    def __init__(self):
+        self.queries: list[QueryRecord] = []
+        self.stack: list[tuple[str, int]] = []
+        self.embeds = 0
+
+    def push(self, name: str):
+        self.stack.append((name, self.embeds))
+        self.embeds += 1
+
+    def pop(self):
+        self.stack.pop()
+
+    def record(self, sql: str, params: Any, duration: float):
+        name, index = self.stack[-1]
+        self.queries.append(
+            QueryRecord(
+                sql=sql,
+                params=repr(params),
+                element=name,
+                chain=tuple(n for n, _ in self.stack),
+                embed_index=index,
+                duration=duration,
+            )
+        )
+
+    def _patterns(self, key) -> dict[Any, QueryPattern]:
+        patterns: dict[Any, QueryPattern] = {}
+        for q in self.queries:
+            pattern = patterns.setdefault(key(q), QueryPattern(sql=q.sql, count=0))
+            pattern.count += 1
+            pattern.elements[q.element] += 1
+        return patterns
+
+    def duplicates(self) -> list[QueryPattern]:
+        """
+        Queries executed more than once with identical parameters.
+        """
+        patterns = self._patterns(lambda q: (q.sql, q.params))
+        return [p for p in patterns.values() if p.count > 1]
+
+    def similar(self, threshold: int) -> list[QueryPattern]:
+        """
+        Queries executed at least `threshold` times with different parameters, the
+        typical N+1 pattern.
+        """
+        distinct: dict[str, set[str]] = {}
+        for q in self.queries:
+            distinct.setdefault(q.sql, set()).add(q.params)
+        patterns = self._patterns(lambda q: q.sql)
+        return [p for sql, p in patterns.items() if len(distinct[sql]) >= threshold]
+
+    def counts_per_embed(self) -> dict[tuple[str, int], int]:
+        """
+        Number of queries per rendered element instance, excluding nested elements.
+        """
+        counts: dict[tuple[str, int], int] = {}
+        for q in self.queries:
+            key = (q.element, q.embed_index)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+
+def get_request_query_log(request: HttpRequest) -> Optional[QueryLog]:
+    context = find_hyperpony_context(request)
+    return context.query_log if context is not None else None
+
+
+@contextmanager
+def inspect_embed_queries(request: HttpRequest, view_class: type) -> Iterator[None]:
+    """
+    Attributes the queries of the `with` block to `view_class`. Does nothing unless
+    `HYPERPONY_QUERY_INSPECTOR` is enabled.
+    """
+    if not is_query_inspector_enabled() and not _captures:
+        yield
+        return
+
+    context = get_hyperpony_context(request)
+    log = context.query_log
+    if log is None:
+        log = context.query_log = QueryLog()
+        for capture in _captures:
+            capture.append(log)
+
+    top_level = len(log.stack) == 0
+    log.push(view_class.__name__)
+    try:
+        if not top_level:
+            yield
+            return
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                log.record(sql, params, time.perf_counter() - start)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            yield
+    finally:
+        log.pop()
+
+
+def report_request_queries(request: HttpRequest):
+    """
+    Logs duplicate and N+1 queries of the request tree as warnings.
+    """
+    log = get_request_query_log(request)
+    if log is None:
+        return
+    for pattern in log.duplicates():
+        logger.warning("duplicate query in %s: %s", request.path, pattern)
+    threshold = getattr(settings, "HYPERPONY_QUERY_INSPECTOR_N_PLUS_ONE", 3)
+    for pattern in log.similar(threshold):
+        logger.warning("possible N+1 query in %s: %s", request.path, pattern)
+
+
+@contextmanager
+def capture_query_logs() -> Iterator[list[QueryLog]]:
+    """
+    Collects the query logs of all requests that embed elements within the `with`
+    block, independent of `HYPERPONY_QUERY_INSPECTOR`.
+    """
+    logs: list[QueryLog] = []
+    _captures.append(logs)
+    try:
+        yield logs
+    finally:
+        _captures.remove(logs)
@@ -0,0 +1,85 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+
+from hyperpony import SingletonPathMixin
+from hyperpony.middleware import HyperponyMiddleware
+from hyperpony.queries import get_request_query_log
+from hyperpony.testutils import assert_max_queries_per_element
+from main.models import AppUser
+
+
+class CountView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(f"{AppUser.objects.count()}")
+
+
+class RowView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        user = AppUser.objects.filter(username=request.GET["username"]).first()
+        return HttpResponse(f"{user}")
+
+
+class ListView(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        count = AppUser.objects.count()
+        rows = [RowView.embed(request, GET={"username": f"u{i}"}) for i in range(4)]
+        return HttpResponse(f"{count} {CountView.embed(request)} {''.join(rows)}")
+
+
+urlpatterns = [
+    CountView.create_path(),
+    RowView.create_path(),
+    ListView.create_path(),
+]
+
+
+def _page(request):
+    return HttpResponse(ListView.embed(request))
+
+
+@pytest.mark.urls("hyperpony.queries_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_QUERY_INSPECTOR=True)
+def test_queries_are_attributed_to_elements(rf: RequestFactory, caplog):
+    request = rf.get("/")
+    with caplog.at_level("WARNING", logger="hyperpony.queries"):
+        HyperponyMiddleware(_page)(request)
+
+    log = get_request_query_log(request)
+    assert log is not None
+    assert [q.element for q in log.queries] == ["ListView", *["RowView"] * 4, "CountView"]
+    assert log.queries[1].chain == ("ListView", "RowView")
+
+    [duplicate] = log.duplicates()
+    assert duplicate.count == 2
+    assert duplicate.elements == {"ListView": 1, "CountView": 1}
+
+    [similar] = log.similar(threshold=3)
+    assert similar.count == 4
+    assert similar.elements == {"RowView": 4}
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert any(m.startswith("duplicate query in /: 2x SELECT COUNT") for m in messages)
+    assert any(m.startswith("possible N+1 query in /: 4x SELECT") for m in messages)
+
+
+@pytest.mark.urls("hyperpony.queries_tests")
+@pytest.mark.django_db
+@override_settings(HYPERPONY_QUERY_INSPECTOR=False)
+def test_query_inspector_disabled(rf: RequestFactory):
+    request = rf.get("/")
+    HyperponyMiddleware(_page)(request)
+    assert get_request_query_log(request) is None
+
+
+@pytest.mark.urls("hyperpony.queries_tests")
+@pytest.mark.django_db
+def test_assert_max_queries_per_element(rf: RequestFactory):
+    with assert_max_queries_per_element({ListView: 1, RowView: 1, "CountView": 1}):
+        _page(rf.get("/"))
+
+    with pytest.raises(AssertionError, match="RowView ran 1 queries"):
+        with assert_max_queries_per_element({RowView: 0}):
+            _page(rf.get("/"))
@@ -1,36 +1,133 @@
-from typing import Callable, Literal, Optional, TypeAlias
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator, Literal, Optional, TypeAlias, Union
 
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
 from django.http import HttpRequest, HttpResponse, HttpResponseBase
 from django_htmx.http import push_url
 
+from hyperpony.context import find_hyperpony_context, get_hyperpony_context
+from hyperpony.memory import trace_memory
+from hyperpony.tracing import ATTR_HANDLER, start_span
 from hyperpony.htmx import enrich_response_with_oob_contents, swap_oob
 
 
-RESPONSE_HANDLER: TypeAlias = Callable[[HttpResponse], Optional[HttpResponse]]
+RESPONSE_HANDLER: TypeAlias = Callable[
+    [HttpResponse], Union[Optional[HttpResponse], Awaitable[Optional[HttpResponse]]]
+]
 
 
 def get_response_handlers_from_request(request: HttpRequest) -> list[RESPONSE_HANDLER]:
-    handlers = getattr(request, "__hyperpony_view_response_handlers", [])
-    setattr(request, "__hyperpony_view_response_handlers", handlers)
-    return handlers
+    return get_hyperpony_context(request).response_handlers
 
 
 def add_response_handler(request: HttpRequest, handler: RESPONSE_HANDLER):
+    """
+    Registers a handler that is called with the final response. Handlers may be
+    coroutine functions.
+    """
     # get_view_fn_call_stack_from_request_or_raise(request)
     handlers = get_response_handlers_from_request(request)
     handlers.append(handler)
 
 
-def process_response(request: HttpRequest, response: HttpResponseBase) -> HttpResponseBase:
-    handlers = get_response_handlers_from_request(request)
-    for handler in handlers:
-        result = handler(response)
+def _get_handlers(request: HttpRequest) -> list[RESPONSE_HANDLER]:
+    context = find_hyperpony_context(request)
+    return context.response_handlers if context is not None else []
+
+
+def _has_work(handlers: list[RESPONSE_HANDLER], response: HttpResponseBase) -> bool:
+    return len(handlers) > 0 or getattr(response, "_hyperpony_swap_oob", None) is not None
+
+
+def _start_response_phase(request: HttpRequest):
+    # handlers render after the views changed data, instances loaded so far may be stale
+    context = find_hyperpony_context(request)
+    if context is not None:
+        context.identity_map.clear()
+
+
+def _handler_name(handler: RESPONSE_HANDLER) -> str:
+    return getattr(handler, "__qualname__", None) or type(handler).__qualname__
+
+
+@contextmanager
+def _observe_handler(request: HttpRequest, handler: RESPONSE_HANDLER) -> Iterator[None]:
+    name = _handler_name(handler)
+    with (
+        start_span("hyperpony.response_handler", {ATTR_HANDLER: name}),
+        trace_memory(request, "handler", name),
+    ):
+        yield
+
+
+def _run_sync_handlers(
+    request: HttpRequest, handlers: list[RESPONSE_HANDLER], start: int, response: HttpResponseBase
+) -> tuple[int, HttpResponseBase]:
+    """
+    Runs the handlers from index `start` until the first coroutine handler. Handlers
+    registered while running are processed as well.
+    """
+    i = start
+    while i < len(handlers) and not iscoroutinefunction(handlers[i]):
+        with _observe_handler(request, handlers[i]):
+            result = handlers[i](response)
         response = result if result is not None else response
+        i += 1
+    return i, response
+
+
+def process_response(request: HttpRequest, response: HttpResponseBase) -> HttpResponseBase:
+    # fast path: nothing was registered, the response is not touched
+    handlers = _get_handlers(request)
+    if not _has_work(handlers, response):
+        return response
+
+    _start_response_phase(request)
+    i = 0
+    while i < len(handlers):
+        i, response = _run_sync_handlers(request, handlers, i, response)
+        if i < len(handlers):
+            with _observe_handler(request, handlers[i]):
+                result = async_to_sync(handlers[i])(response)  # type: ignore[arg-type]
+            response = result if result is not None else response
+            i += 1
 
     enrich_response_with_oob_contents(response)
     return response
 
 
+async def aprocess_response(request: HttpRequest, response: HttpResponseBase) -> HttpResponseBase:
+    """
+    Async variant of `process_response()`. Sync handlers may use the ORM and parse
+    HTML, so they run in the sync thread instead of on the event loop. Appending OOB
+    fragments runs in a worker thread if they exceed
+    `HYPERPONY_ASYNC_OFFLOAD_THRESHOLD` bytes.
+    """
+    handlers = _get_handlers(request)
+    if not _has_work(handlers, response):
+        return response
+
+    _start_response_phase(request)
+    i = 0
+    while i < len(handlers):
+        if iscoroutinefunction(handlers[i]):
+            with _observe_handler(request, handlers[i]):
+                result = await handlers[i](response)  # type: ignore[misc]
+            response = result if result is not None else response
+            i += 1
+        else:
+            i, response = await sync_to_async(_run_sync_handlers)(request, handlers, i, response)
+
+    collector = getattr(response, "_hyperpony_swap_oob", None)
+    threshold = getattr(settings, "HYPERPONY_ASYNC_OFFLOAD_THRESHOLD", 64 * 1024)
+    if collector is not None and collector.nbytes() >= threshold:
+        await sync_to_async(enrich_response_with_oob_contents, thread_sensitive=False)(response)
+    else:
+        enrich_response_with_oob_contents(response)
+    return response
+
+
 def hook_push_url(request: HttpRequest, url: str | Literal[False]):
     add_response_handler(request, lambda response: push_url(response, url))
 
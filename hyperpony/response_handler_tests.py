@@ -1,9 +1,16 @@
+import asyncio
+import threading
+
+import lxml.html
 from django.http import HttpResponse
-from django.test import RequestFactory
+from django.test import RequestFactory, override_settings
 from django.views import View
+from pytest_mock import MockerFixture
 
-from hyperpony import ViewUtilsMixin
-from hyperpony.response_handler import process_response
+from hyperpony import ElementMixin, ViewUtilsMixin
+from hyperpony import response_handler
+from hyperpony.htmx import swap_oob
+from hyperpony.response_handler import add_response_handler, aprocess_response, process_response
 from hyperpony.utils import response_to_str
 
 
@@ -18,3 +25,134 @@ def test_viewutils_add_swap_oob(rf: RequestFactory):
     res = process_response(req, res)
     res_str = response_to_str(res)
     assert res_str == 'main<div id="oob" hx-swap-oob="outerHTML:#oob">OOB</div>'
+
+
+def test_viewutils_add_swap_oob_element_response_without_parsing(
+    rf: RequestFactory, mocker: MockerFixture
+):
+    class OOBElement(ElementMixin, View):
+        def get(self, request, *args, **kwargs):
+            return HttpResponse("<p>OOB</p>")
+
+    class ViewWithOOBElement(ViewUtilsMixin, View):
+        def dispatch(self, request, *args, **kwargs):
+            self.add_swap_oob(OOBElement.as_view()(request))
+            return HttpResponse("main")
+
+    spy = mocker.spy(lxml.html, "fromstring")
+    req = rf.get("/")
+    res = process_response(req, ViewWithOOBElement.as_view()(req))
+    assert spy.call_count == 0
+
+    oob = lxml.html.fromstring(response_to_str(res)[len("main") :])
+    assert oob.attrib["id"] == "OOBElement"
+    assert oob.attrib["hx-swap-oob"] == "outerHTML:#OOBElement"
+    assert "hyperpony-element" in oob.attrib
+    assert oob.text_content() == "OOB"
+
+
+def test_swap_oob_500_fragments_deduplicated_per_id(rf: RequestFactory):
+    class ViewWithManyOOBs(ViewUtilsMixin, View):
+        def dispatch(self, request, *args, **kwargs):
+            for i in range(500):
+                self.add_swap_oob(HttpResponse(f"<div id='oob{i % 250}'>{i}</div>"))
+            return HttpResponse("main")
+
+    req = rf.get("/")
+    res = process_response(req, ViewWithManyOOBs.as_view()(req))
+
+    parsed = lxml.html.fragments_fromstring(response_to_str(res))
+    assert parsed[0] == "main"
+    oobs = parsed[1:]
+    assert [o.attrib["id"] for o in oobs] == [f"oob{i}" for i in range(250)]
+    assert [o.text for o in oobs] == [str(i) for i in range(250, 500)]
+    assert all(o.attrib["hx-swap-oob"] == f"outerHTML:#{o.attrib['id']}" for o in oobs)
+
+
+def test_swap_oob_keeps_additive_swaps_into_one_target(rf: RequestFactory):
+    class ViewWithToasts(ViewUtilsMixin, View):
+        def dispatch(self, request, *args, **kwargs):
+            for toast in ("first", "second"):
+                self.add_swap_oob(
+                    HttpResponse(f"<ul id='toasts'><li>{toast}</li></ul>"), "beforeend"
+                )
+            self.add_swap_oob(HttpResponse("<div id='status'>old</div>"))
+            self.add_swap_oob(HttpResponse("<div id='status'>new</div>"))
+            return HttpResponse("main")
+
+    req = rf.get("/")
+    res = process_response(req, ViewWithToasts.as_view()(req))
+
+    oobs = lxml.html.fragments_fromstring(response_to_str(res))[1:]
+    assert [o.text_content() for o in oobs] == ["first", "second", "new"]
+    assert [o.attrib["hx-swap-oob"] for o in oobs] == [
+        "beforeend:#toasts",
+        "beforeend:#toasts",
+        "outerHTML:#status",
+    ]
+
+
+def test_process_response_without_handlers_keeps_response_untouched(rf: RequestFactory):
+    req = rf.get("/")
+    res = HttpResponse(b"<p>page</p>")
+    container = res._container  # noqa: SLF001
+    assert process_response(req, res) is res
+    assert res._container is container  # noqa: SLF001
+    assert not hasattr(req, "hyperpony_context")
+
+
+def test_process_response_coroutine_handler(rf: RequestFactory):
+    async def handler(response):
+        response["X-Handled"] = "async"
+
+    req = rf.get("/")
+    add_response_handler(req, handler)
+    res = process_response(req, HttpResponse("main"))
+    assert res["X-Handled"] == "async"
+
+
+def test_aprocess_response_runs_sync_handlers_off_the_event_loop(rf: RequestFactory):
+    threads = {}
+
+    def sync_handler(response):
+        threads["sync"] = threading.get_ident()
+        response.write(b"+sync")
+
+    async def async_handler(response):
+        threads["async"] = threading.get_ident()
+        response.write(b"+async")
+
+    async def run(req):
+        threads["loop"] = threading.get_ident()
+        return await aprocess_response(req, HttpResponse("main"))
+
+    req = rf.get("/")
+    add_response_handler(req, sync_handler)
+    add_response_handler(req, async_handler)
+    res = asyncio.run(run(req))
+
+    assert response_to_str(res) == "main+sync+async"
+    assert threads["async"] == threads["loop"]
+    assert threads["sync"] != threads["loop"]
+
+
+@override_settings(HYPERPONY_ASYNC_OFFLOAD_THRESHOLD=0)
+def test_aprocess_response_offloads_large_oob_contents(rf: RequestFactory, mocker: MockerFixture):
+    threads = {}
+    enrich = response_handler.enrich_response_with_oob_contents
+
+    def spy(response):
+        threads["enrich"] = threading.get_ident()
+        enrich(response)
+
+    mocker.patch.object(response_handler, "enrich_response_with_oob_contents", spy)
+
+    async def run(req):
+        threads["loop"] = threading.get_ident()
+        res = HttpResponse("main")
+        swap_oob(res, HttpResponse("<div id='oob'>OOB</div>"))
+        return await aprocess_response(req, res)
+
+    res = asyncio.run(run(rf.get("/")))
+    assert response_to_str(res) == 'main<div id="oob" hx-swap-oob="outerHTML:#oob">OOB</div>'
+    assert threads["enrich"] != threads["loop"]
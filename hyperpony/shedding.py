@@ -0,0 +1,76 @@
+from enum import IntEnum
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.urls import Resolver404, resolve
+from django_htmx.http import reswap
+
+from hyperpony.metrics import element_shed, is_metrics_enabled
+from hyperpony.polling import POLL_INTERVAL_HEADER, apply_polling_policy, server_pressure
+
+
+class Priority(IntEnum):
+    """
+    Priority of an element's polls under load. Only htmx polls are shed, they are
+    retried with the next interval anyway. Page loads, form submissions, user-initiated
+    and lazy-loading requests are always served.
+    """
+
+    # shed once the server is over capacity
+    LOW = 0
+    # shed once the server is over `HYPERPONY_LOAD_SHEDDING_NORMAL_FACTOR` times capacity
+    NORMAL = 1
+    # never shed
+    CRITICAL = 2
+
+
+def get_load_shedding_capacity() -> Optional[int]:
+    return getattr(settings, "HYPERPONY_LOAD_SHEDDING_MAX_IN_FLIGHT", None)
+
+
+def _resolve_view_class(request: HttpRequest) -> Optional[type]:
+    try:
+        match = resolve(request.path_info, getattr(request, "urlconf", None))
+    except Resolver404:
+        return None
+    return getattr(match.func, "view_class", None)
+
+
+def get_shed_response(request: HttpRequest) -> Optional[HttpResponse]:
+    """
+    Called by the middleware before the view. Returns an empty response if the request
+    is a poll and the number of in-flight requests exceeds the capacity for the view's
+    `priority`, otherwise None. The response is the one of an unchanged poll, with the
+    view's `unchanged_status` (286 stops the polling).
+    """
+    capacity = get_load_shedding_capacity()
+    if (
+        capacity is None
+        or request.method not in ("GET", "HEAD")
+        or request.headers.get("HX-Request") != "true"
+        or POLL_INTERVAL_HEADER not in request.headers
+        or server_pressure.in_flight <= capacity
+    ):
+        return None
+
+    # only resolved when over capacity
+    view_class = _resolve_view_class(request)
+    priority = getattr(view_class, "priority", None)
+    if priority is None:
+        priority = Priority.LOW
+    if priority >= Priority.CRITICAL:
+        return None
+    if priority == Priority.NORMAL:
+        normal_capacity = capacity * getattr(settings, "HYPERPONY_LOAD_SHEDDING_NORMAL_FACTOR", 2)
+        if server_pressure.in_flight <= normal_capacity:
+            return None
+
+    if is_metrics_enabled():
+        element_shed.inc((view_class.__name__ if view_class is not None else "-",))
+    # the browser keeps the element's current content
+    response = reswap(HttpResponse(status=getattr(view_class, "unchanged_status", 204)), "none")
+    policy = getattr(view_class, "polling_policy", None)
+    if policy is not None:
+        apply_polling_policy(request, response, policy, changed=False)
+    return response
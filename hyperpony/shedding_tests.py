@@ -0,0 +1,118 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+from django.views import View
+
+from hyperpony import ElementMixin, SingletonPathMixin
+from hyperpony.middleware import HyperponyMiddleware
+from hyperpony.polling import POLL_INTERVAL_HEADER, PollingPolicy, server_pressure
+from hyperpony.shedding import Priority
+
+rendered: list[str] = []
+
+
+class TView(SingletonPathMixin, ElementMixin, View):
+    def get(self, request, *args, **kwargs):
+        rendered.append(self.__class__.__name__)
+        return HttpResponse("content")
+
+    post = get
+
+
+class TViewNormal(TView):
+    priority = Priority.NORMAL
+
+
+class TViewCritical(TView):
+    priority = Priority.CRITICAL
+
+
+class TViewPolicy(TView):
+    polling_policy = PollingPolicy(min_interval=2, max_interval=60, backoff=2)
+
+
+class TViewStopPolling(TView):
+    unchanged_status = 286
+
+
+urlpatterns = [
+    TView.create_path(),
+    TViewNormal.create_path(),
+    TViewCritical.create_path(),
+    TViewPolicy.create_path(),
+    TViewStopPolling.create_path(),
+]
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    server_pressure.reset()
+    rendered.clear()
+    yield
+    server_pressure.reset()
+
+
+def _busy(in_flight: int):
+    for _ in range(in_flight):
+        server_pressure.start()
+
+
+def _url(view) -> str:
+    return reverse(view.get_path_name())
+
+
+def _poll(rf: RequestFactory, view=TView):
+    return rf.get(_url(view), HTTP_HX_REQUEST="true", HTTP_X_HYPERPONY_POLL_INTERVAL="4")
+
+
+def _serve(request):
+    return HyperponyMiddleware(lambda r: resolve(r.path_info).func(r))(request)
+
+
+@pytest.mark.urls("hyperpony.shedding_tests")
+@override_settings(HYPERPONY_LOAD_SHEDDING_MAX_IN_FLIGHT=2)
+def test_polls_are_shed_before_the_view_runs(rf: RequestFactory):
+    # the request itself is in flight, too
+    _busy(1)
+    assert _serve(_poll(rf)).status_code == 200
+    assert rendered == ["TView"]
+
+    _busy(1)
+    shed = _serve(_poll(rf))
+    assert shed.status_code == 204
+    assert shed["HX-Reswap"] == "none"
+    assert rendered == ["TView"]
+    assert server_pressure.in_flight == 2
+
+    shed_policy = _serve(_poll(rf, TViewPolicy))
+    assert shed_policy.status_code == 204
+    assert shed_policy[POLL_INTERVAL_HEADER] == "8.0"
+
+    shed_stop = _serve(_poll(rf, TViewStopPolling))
+    assert shed_stop.status_code == 286
+    assert shed_stop["HX-Reswap"] == "none"
+    assert rendered == ["TView"]
+
+
+@pytest.mark.urls("hyperpony.shedding_tests")
+@override_settings(HYPERPONY_LOAD_SHEDDING_MAX_IN_FLIGHT=0)
+def test_only_polls_are_shed(rf: RequestFactory):
+    url = _url(TView)
+    # user-initiated and lazy-loading (placeholder) htmx requests
+    assert _serve(rf.get(url, HTTP_HX_REQUEST="true")).status_code == 200
+    assert _serve(rf.get(url)).status_code == 200
+    assert _serve(rf.post(url, HTTP_HX_REQUEST="true")).status_code == 200
+    assert _serve(_poll(rf, TViewCritical)).status_code == 200
+    assert rendered == ["TView", "TView", "TView", "TViewCritical"]
+
+
+@pytest.mark.urls("hyperpony.shedding_tests")
+@override_settings(HYPERPONY_LOAD_SHEDDING_MAX_IN_FLIGHT=2, HYPERPONY_LOAD_SHEDDING_NORMAL_FACTOR=2)
+def test_normal_priority_is_shed_over_factor_times_capacity(rf: RequestFactory):
+    _busy(3)
+    assert _serve(_poll(rf, TViewNormal)).status_code == 200
+    assert _serve(_poll(rf)).status_code == 204
+    _busy(1)
+    assert _serve(_poll(rf, TViewNormal)).status_code == 204
+    assert rendered == ["TViewNormal"]
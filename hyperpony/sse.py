@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Optional, Union
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Model
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from django_htmx.middleware import HtmxDetails
+
+from hyperpony.context import HyperponyContext
+from hyperpony.htmx import swap_oob
+from hyperpony.response_handler import process_response
+from hyperpony.views import invoke_view
+
+
+logger = logging.getLogger("hyperpony.sse")
+
+SSE_EVENT = "hyperpony-oob"
+
+DEFAULT_CHANNEL = "default"
+
+
+class Subscription(ABC):
+    """
+    The messages of a channel for one subscriber. `get()` must be cancellation safe:
+    a message must not be lost if the waiting task is cancelled.
+    """
+
+    @abstractmethod
+    async def get(self) -> dict[str, Any]:
+        raise NotImplementedError()
+
+    async def close(self):
+        pass
+
+
+class Broker(ABC):
+    """
+    Fans out published messages to the subscribers of a channel. Messages are
+    JSON-serializable dicts, implementations for multiple processes may forward them to
+    a pub/sub service. Configured with `HYPERPONY_SSE_BROKER`.
+    """
+
+    @abstractmethod
+    def publish(self, channel: str, message: dict[str, Any]):
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> Subscription:
+        raise NotImplementedError()
+
+
+class InProcessSubscription(Subscription):
+    def __init__(self, broker: "InProcessBroker", channel: str):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    def put(self, message: dict[str, Any]):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+        except RuntimeError:
+            # the subscriber's event loop is closed
+            pass
+
+    async def get(self) -> dict[str, Any]:
+        return await self.queue.get()
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker(Broker):
+    """
+    Delivers messages to the subscribers of the current process. `publish()` may be
+    called from any thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions: dict[str, set[InProcessSubscription]] = {}
+
+    def publish(self, channel: str, message: dict[str, Any]):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    async def subscribe(self, channel: str) -> Subscription:
+        subscription = InProcessSubscription(self, channel)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: InProcessSubscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.channel, None)
+
+
+_broker: Optional[tuple[str, Broker]] = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> Broker:
+    global _broker
+    path = getattr(settings, "HYPERPONY_SSE_BROKER", "hyperpony.sse.InProcessBroker")
+    with _broker_lock:
+        if _broker is None or _broker[0] != path:
+            _broker = (path, import_string(path)())
+        return _broker[1]
+
+
+# noinspection PyPep8Naming
+def publish_element_update(
+    view: Union[str, type],
+    *,
+    channel: str = DEFAULT_CHANNEL,
+    GET: Optional[dict[str, Any]] = None,  # noqa: N803
+    args: Optional[list[Any]] = None,
+    kwargs: Optional[dict[str, Any]] = None,
+    hx_swap="outerHTML",
+):
+    """
+    Tells the subscribers of `channel` that the element `view` (a path name or a view
+    class registered with `create_path()`) changed. Each subscriber renders the element
+    for its own request and receives it as OOB swap. Model instances in `kwargs` are
+    passed by primary key.
+    """
+    path_name = view if isinstance(view, str) else view.get_path_name()  # type: ignore[attr-defined]
+    if path_name is None:
+        raise Exception(f"View {view} was not registered with create_path().")
+    get_broker().publish(
+        channel,
+        {
+            "path_name": path_name,
+            "GET": GET,
+            "args": args,
+            "kwargs": {k: v.pk if isinstance(v, Model) else v for k, v in kwargs.items()}
+            if kwargs is not None
+            else None,
+            "hx_swap": hx_swap,
+        },
+    )
+
+
+def _mark_htmx_request(request: HttpRequest):
+    # the EventSource request of the subscriber does not send HX-Request
+    if request.headers.get("HX-Request") == "true":
+        return
+    request.META["HTTP_HX_REQUEST"] = "true"
+    # request.headers is cached
+    request.__dict__.pop("headers", None)
+    if getattr(request, "htmx", None) is not None:
+        setattr(request, "htmx", HtmxDetails(request))
+
+
+def render_element_update(request: HttpRequest, message: dict[str, Any]) -> Optional[bytes]:
+    """
+    Renders a published element update as OOB fragment, using the subscriber's request.
+    The update is rendered as htmx request, so that the OOB swaps added by the element
+    (e.g. with `add_swap_oob_view()`) are sent, too. Returns None if the view did not
+    respond with 2xx.
+    """
+    _mark_htmx_request(request)
+    # the context of the SSE request would otherwise collect state across updates
+    setattr(request, "hyperpony_context", HyperponyContext())
+    rendered = invoke_view(
+        request,
+        message["path_name"],
+        GET=message["GET"],
+        args=message["args"],
+        kwargs=message["kwargs"],
+    )
+    if not 200 <= rendered.status_code < 300:
+        return None
+    response = swap_oob(HttpResponse(), rendered, message["hx_swap"])
+    return process_response(request, response).content
+
+
+def _format_event(data: bytes) -> bytes:
+    lines = b"".join(b"data: " + line + b"\n" for line in data.splitlines())
+    return b"event: " + SSE_EVENT.encode() + b"\n" + lines + b"\n"
+
+
+async def _stream_element_updates(request: HttpRequest, channel: str) -> AsyncIterator[bytes]:
+    keepalive = getattr(settings, "HYPERPONY_SSE_KEEPALIVE", 15)
+    subscription = await get_broker().subscribe(channel)
+    try:
+        # sent right away, so that proxies forward the response headers
+        yield b": connected\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), keepalive)
+            except TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            try:
+                content = await sync_to_async(render_element_update)(request, message)
+            except Exception:
+                logger.exception("rendering the update of %s failed", message.get("path_name"))
+                continue
+            if content:
+                yield _format_event(content)
+    finally:
+        await subscription.close()
+
+
+async def sse_view(request: HttpRequest, channel: str = DEFAULT_CHANNEL) -> StreamingHttpResponse:
+    """
+    Streams the element updates published to `channel` as server-sent events with
+    rendered OOB fragments, which hyperpony.js swaps into the page. Requires an ASGI
+    server. Every client that reaches the URL receives the updates of `channel`.
+    """
+    response = StreamingHttpResponse(
+        _stream_element_updates(request, channel), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # disables response buffering of nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+from django_htmx.middleware import HtmxDetails
+
+from hyperpony import ElementMixin, SingletonPathMixin, ViewUtilsMixin
+from hyperpony.sse import Broker, get_broker, publish_element_update, sse_view
+
+
+class CounterElement(SingletonPathMixin, ElementMixin, View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(f"{request.GET['count']} {request.user}")
+
+
+class TotalElement(SingletonPathMixin, ElementMixin, View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse("total")
+
+
+class RowElement(SingletonPathMixin, ViewUtilsMixin, ElementMixin, View):
+    def get(self, request, *args, **kwargs):
+        self.add_swap_oob_view("hyperpony-sse_tests-TotalElement")
+        return HttpResponse("row")
+
+
+class FailingElement(SingletonPathMixin, ElementMixin, View):
+    def get(self, request, *args, **kwargs):
+        raise Exception("failed")
+
+
+urlpatterns = [
+    CounterElement.create_path(),
+    TotalElement.create_path(),
+    RowElement.create_path(),
+    FailingElement.create_path(),
+]
+
+
+def _subscribe(rf: RequestFactory, channel: str, publish):
+    request = rf.get("/")
+    request.user = "alice"
+    # HtmxMiddleware
+    request.htmx = HtmxDetails(request)
+
+    async def consume():
+        response = await sse_view(request, channel)
+        content = response.streaming_content
+        events = [await anext(content)]
+        publish()
+        events.append(await anext(content))
+        await content.aclose()
+        return response, events
+
+    return asyncio.run(consume())
+
+
+@pytest.mark.urls("hyperpony.sse_tests")
+def test_sse_streams_rendered_oob_fragments(rf: RequestFactory):
+    def publish():
+        publish_element_update(FailingElement, channel="counter")
+        publish_element_update(CounterElement, channel="other", GET={"count": "1"})
+        publish_element_update(CounterElement, channel="counter", GET={"count": "2"})
+
+    response, events = _subscribe(rf, "counter", publish)
+
+    assert response["Content-Type"] == "text/event-stream"
+    assert events[0] == b": connected\n\n"
+    event = events[1].decode()
+    assert event.startswith("event: hyperpony-oob\ndata: <div ")
+    assert "hx-swap-oob='outerHTML:#CounterElement'" in event
+    assert "2 alice" in event
+    assert event.endswith("</div>\n\n")
+    assert get_broker().subscriptions == {}  # type: ignore[attr-defined]
+
+
+@pytest.mark.urls("hyperpony.sse_tests")
+@override_settings(HYPERPONY_SSE_KEEPALIVE=0.01)
+def test_sse_keepalive(rf: RequestFactory):
+    _, events = _subscribe(rf, "idle", lambda: None)
+    assert events[1] == b": keepalive\n\n"
+
+
+@pytest.mark.urls("hyperpony.sse_tests")
+def test_sse_update_includes_oob_swaps_of_element(rf: RequestFactory):
+    _, events = _subscribe(rf, "rows", lambda: publish_element_update(RowElement, channel="rows"))
+    event = events[1].decode()
+    assert "hx-swap-oob='outerHTML:#RowElement'" in event
+    assert "hx-swap-oob='outerHTML:#TotalElement'" in event
+    assert "total" in event
+
+
+def test_broker_requires_publish_and_subscribe():
+    class PublishOnlyBroker(Broker):
+        def publish(self, channel, message):
+            pass
+
+    with pytest.raises(TypeError):
+        PublishOnlyBroker()  # type: ignore[abstract]
+
+
+def test_publish_unregistered_view():
+    class Unregistered(SingletonPathMixin, View):
+        pass
+
+    with pytest.raises(Exception, match="was not registered"):
+        publish_element_update(Unregistered)
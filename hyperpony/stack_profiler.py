@@ -0,0 +1,264 @@
+import cProfile
+import logging
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponseBase
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger("hyperpony.stack_profiler")
+
+DEFAULT_REQUEST_PROFILING: dict[str, Any] = {
+    "header": "X-Hyperpony-Profile",
+    "query_param": "_hyperpony_profile",
+    "permission": "hyperpony.stack_profiler.is_superuser",
+    "output_dir": None,
+    "interval": 0.001,
+}
+
+
+def is_superuser(request: HttpRequest) -> bool:
+    user = getattr(request, "user", None)
+    return bool(getattr(user, "is_superuser", False))
+
+
+def get_request_profiling_settings() -> Optional[dict[str, Any]]:
+    """
+    Returns the settings of on-demand request profiling, or None if
+    `HYPERPONY_REQUEST_PROFILING` is not configured.
+    """
+    config = getattr(settings, "HYPERPONY_REQUEST_PROFILING", None)
+    if config is None:
+        return None
+    return {**DEFAULT_REQUEST_PROFILING, **config}
+
+
+################################################################################
+### frame labels
+################################################################################
+
+
+def _class_name(value: Any) -> str:
+    return value.__class__.__name__ if value is not None else "?"
+
+
+def _label_invoke(frame: FrameType) -> str:
+    view_class = frame.f_locals.get("view_class")
+    kind = frame.f_locals.get("kind", "invoke")
+    return f"hyperpony:{kind}[{getattr(view_class, '__name__', '?')}]"
+
+
+def _label_params(frame: FrameType) -> str:
+    return f"hyperpony:params[{_class_name(frame.f_locals.get('self'))}]"
+
+
+def _label_element(frame: FrameType) -> str:
+    return f"hyperpony:element[{_class_name(frame.f_locals.get('self'))}]"
+
+
+def _label_wrap(frame: FrameType) -> str:
+    meta = frame.f_locals.get("meta")
+    return f"hyperpony:wrap[{getattr(meta, 'name', None) or '?'}]"
+
+
+def _label_swap_oob(frame: FrameType) -> str:
+    return "hyperpony:swap_oob"
+
+
+_labelers: Optional[dict[Any, Callable[[FrameType], str]]] = None
+
+
+def _get_labelers() -> dict[Any, Callable[[FrameType], str]]:
+    global _labelers
+    if _labelers is None:
+        from hyperpony.element import ElementMixin, ElementResponse
+        from hyperpony.htmx import swap_oob
+        from hyperpony.inject_params import InjectParamsMixin
+        from hyperpony.views import _invoke_resolved_view
+
+        _labelers = {
+            _invoke_resolved_view.__code__: _label_invoke,
+            InjectParamsMixin.setup.__code__: _label_params,
+            ElementMixin.dispatch.__code__: _label_element,
+            ElementResponse.wrap.__code__: _label_wrap,
+            swap_oob.__code__: _label_swap_oob,
+        }
+    return _labelers
+
+
+def _frame_label(frame: FrameType, labelers: dict[Any, Callable[[FrameType], str]]) -> str:
+    code = frame.f_code
+    labeler = labelers.get(code)
+    if labeler is not None:
+        return labeler(frame)
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{code.co_qualname}"
+
+
+def collapse_stack(frame: Optional[FrameType]) -> str:
+    """
+    Returns the stack of `frame` as a single line, outermost frame first, in the
+    collapsed format used by flamegraph tools. Hyperpony frames are labelled with
+    the element or view class they are processing.
+    """
+    labelers = _get_labelers()
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame, labelers))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+################################################################################
+### profilers
+################################################################################
+
+
+class StackSampler:
+    """
+    Samples the stacks of the given threads from a background thread. If `thread_ids`
+    is None, all threads except the sampler are sampled.
+    """
+
+    def __init__(self, interval: float, thread_ids: Optional[set[int]] = None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="hyperpony-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def sample(self):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():  # noqa: SLF001
+            if thread_id == own:
+                continue
+            if self.thread_ids is not None and thread_id not in self.thread_ids:
+                continue
+            self.stacks[collapse_stack(frame)] += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+# only one cProfile profiler can be active per process
+_cprofile_lock = threading.Lock()
+
+
+class RequestStackProfile:
+    """
+    Profiles a single request with the sampling profiler (mode `sample`) or
+    `cProfile` (mode `cprofile`). `cProfile` only records the calling thread. If
+    another `cProfile` profiler is active, the request is sampled instead.
+    """
+
+    def __init__(self, request: HttpRequest, mode: str, config: dict[str, Any], all_threads: bool):
+        self.request = request
+        self.mode = mode
+        self.config = config
+        self.all_threads = all_threads
+        self.sampler: Optional[StackSampler] = None
+        self.cprofile: Optional[cProfile.Profile] = None
+
+    def start(self):
+        if self.mode == "cprofile" and _cprofile_lock.acquire(blocking=False):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                self.cprofile = profile
+                return
+            except ValueError:
+                # a profiler that was not started by hyperpony
+                _cprofile_lock.release()
+        if self.mode == "cprofile":
+            logger.warning("another profiler is active, sampling %s instead", self.request.path)
+            self.mode = "sample"
+
+        thread_ids = None if self.all_threads else {threading.get_ident()}
+        self.sampler = StackSampler(self.config["interval"], thread_ids)
+        self.sampler.start()
+
+    def stop(self) -> Path:
+        output_dir = Path(self.config["output_dir"] or tempfile.gettempdir())
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", self.request.path).strip("_") or "root"
+        name = f"hyperpony-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9}-{slug}"
+
+        if self.cprofile is not None:
+            try:
+                self.cprofile.disable()
+            finally:
+                _cprofile_lock.release()
+            path = output_dir / f"{name}.prof"
+            self.cprofile.dump_stats(path)
+        else:
+            assert self.sampler is not None
+            self.sampler.stop()
+            path = output_dir / f"{name}.collapsed"
+            path.write_text(self.sampler.collapsed())
+
+        logger.info("profile of %s written to %s", self.request.path, path)
+        return path
+
+
+def _requested_mode(request: HttpRequest, config: dict[str, Any]) -> Optional[str]:
+    value = request.headers.get(config["header"]) or request.GET.get(config["query_param"])
+    if not value:
+        return None
+    return "cprofile" if value == "cprofile" else "sample"
+
+
+def start_request_stack_profile(
+    request: HttpRequest, config: dict[str, Any], all_threads: bool = False
+) -> Optional[RequestStackProfile]:
+    """
+    Starts profiling the request if it asks for it with the configured header or query
+    parameter and passes the permission check. `config` is the result of
+    `get_request_profiling_settings()`.
+    """
+    mode = _requested_mode(request, config)
+    if mode is None:
+        return None
+
+    permission = config["permission"]
+    if isinstance(permission, str):
+        permission = import_string(permission)
+    if not permission(request):
+        logger.warning("profiling of %s denied", request.path)
+        return None
+
+    profile = RequestStackProfile(request, mode, config, all_threads)
+    profile.start()
+    return profile
+
+
+def finish_request_stack_profile(
+    profile: Optional[RequestStackProfile], response: Optional[HttpResponseBase]
+):
+    """
+    Stops the profile. `response` is None if the request failed, the profile is
+    written anyway.
+    """
+    if profile is None:
+        return
+    path = profile.stop()
+    if response is not None:
+        response.headers[profile.config["header"]] = path.name
@@ -0,0 +1,131 @@
+import cProfile
+import inspect
+import pstats
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+
+from hyperpony import ElementMixin, SingletonPathMixin
+from hyperpony.middleware import HyperponyMiddleware
+from hyperpony.response_handler import add_response_handler
+from hyperpony.stack_profiler import collapse_stack
+
+
+class SampledElement(SingletonPathMixin, ElementMixin, View):
+    def get(self, request, *args, **kwargs):
+        time.sleep(0.03)
+        return HttpResponse("sampled")
+
+
+urlpatterns = [
+    SampledElement.create_path(),
+]
+
+
+def _page(request):
+    return HttpResponse(SampledElement.embed(request))
+
+
+def _superuser_request(rf: RequestFactory, **kwargs):
+    request = rf.get("/page", **kwargs)
+    request.user = SimpleNamespace(is_superuser=True)
+    return request
+
+
+@pytest.mark.urls("hyperpony.stack_profiler_tests")
+def test_collapsed_stack_of_current_frame():
+    stack = collapse_stack(inspect.currentframe())
+    assert stack.split(";")[-1] == (
+        "hyperpony.stack_profiler_tests:test_collapsed_stack_of_current_frame"
+    )
+
+
+@pytest.mark.urls("hyperpony.stack_profiler_tests")
+def test_sampling_profile_labels_elements(rf: RequestFactory, tmp_path):
+    with override_settings(HYPERPONY_REQUEST_PROFILING={"output_dir": tmp_path}):
+        request = _superuser_request(rf, HTTP_X_HYPERPONY_PROFILE="1")
+        response = HyperponyMiddleware(_page)(request)
+
+    path = tmp_path / response["X-Hyperpony-Profile"]
+    assert path.suffix == ".collapsed"
+    lines = path.read_text().splitlines()
+    assert len(lines) > 0
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("hyperpony:embed[SampledElement];" in line for line in lines)
+    assert any("hyperpony:element[SampledElement];" in line for line in lines)
+
+
+@pytest.mark.urls("hyperpony.stack_profiler_tests")
+def test_cprofile_via_query_param(rf: RequestFactory, tmp_path):
+    with override_settings(HYPERPONY_REQUEST_PROFILING={"output_dir": tmp_path}):
+        request = _superuser_request(rf, data={"_hyperpony_profile": "cprofile"})
+        response = HyperponyMiddleware(_page)(request)
+
+    path = tmp_path / response["X-Hyperpony-Profile"]
+    assert path.suffix == ".prof"
+    stats = pstats.Stats(str(path))
+    assert any(func[2] == "_invoke_resolved_view" for func in stats.stats)  # type: ignore[attr-defined]
+
+
+@pytest.mark.urls("hyperpony.stack_profiler_tests")
+def test_profiling_requires_permission(rf: RequestFactory, tmp_path):
+    with override_settings(HYPERPONY_REQUEST_PROFILING={"output_dir": tmp_path}):
+        request = rf.get("/page", HTTP_X_HYPERPONY_PROFILE="1")
+        request.user = SimpleNamespace(is_superuser=False)
+        response = HyperponyMiddleware(_page)(request)
+
+    assert "X-Hyperpony-Profile" not in response
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.urls("hyperpony.stack_profiler_tests")
+def test_profiling_not_configured(rf: RequestFactory):
+    request = _superuser_request(rf, HTTP_X_HYPERPONY_PROFILE="1")
+    response = HyperponyMiddleware(_page)(request)
+    assert "X-Hyperpony-Profile" not in response
+
+
+@pytest.mark.urls("hyperpony.stack_profiler_tests")
+def test_profile_is_stopped_if_response_processing_fails(rf: RequestFactory, tmp_path):
+    def failing_handler(response):
+        raise ValueError("handler failed")
+
+    def page(request):
+        add_response_handler(request, failing_handler)
+        return _page(request)
+
+    with override_settings(HYPERPONY_REQUEST_PROFILING={"output_dir": tmp_path}):
+        request = _superuser_request(rf, HTTP_X_HYPERPONY_PROFILE="1")
+        with pytest.raises(ValueError, match="handler failed"):
+            HyperponyMiddleware(page)(request)
+
+    assert not any(t.name == "hyperpony-sampler" for t in threading.enumerate())
+    [path] = tmp_path.iterdir()
+    assert path.suffix == ".collapsed"
+
+
+@pytest.mark.urls("hyperpony.stack_profiler_tests")
+def test_cprofile_falls_back_to_sampling_if_a_profiler_is_active(rf: RequestFactory, tmp_path):
+    active = cProfile.Profile()
+    active.enable()
+    try:
+        with override_settings(HYPERPONY_REQUEST_PROFILING={"output_dir": tmp_path}):
+            request = _superuser_request(rf, data={"_hyperpony_profile": "cprofile"})
+            response = HyperponyMiddleware(_page)(request)
+    finally:
+        active.disable()
+
+    assert response.status_code == 200
+    assert response["X-Hyperpony-Profile"].endswith(".collapsed")
+
+    # the lock was released, cProfile works again
+    with override_settings(HYPERPONY_REQUEST_PROFILING={"output_dir": tmp_path}):
+        request = _superuser_request(rf, data={"_hyperpony_profile": "cprofile"})
+        response = HyperponyMiddleware(_page)(request)
+    assert response["X-Hyperpony-Profile"].endswith(".prof")
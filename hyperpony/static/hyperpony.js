@@ -22,3 +22,81 @@ function addCsrfTokenHeader(event) {
 document.body.addEventListener('htmx:configRequest', addCsrfTokenHeader);
 
 document.body.addEventListener("fetch:beforeRequest", addCsrfTokenHeader);
+
+document.body.addEventListener('htmx:configRequest', function (evt) {
+    // only polls, other GETs (e.g. pagination) of the element must be rendered
+    if (evt.detail.verb !== "get" || getPollInterval(evt.detail.elt) === null) {
+        return;
+    }
+
+    // lets the server answer polling requests without rendering if the element is unchanged
+    let el = evt.detail.elt.closest("[hyperpony-version]");
+    if (el !== null && evt.detail.target === el) {
+        evt.detail.headers["X-Hyperpony-Version"] = el.getAttribute("hyperpony-version");
+    }
+});
+
+function getPollInterval(el) {
+    let trigger = el.getAttribute("hx-trigger");
+    let match = trigger !== null ? trigger.match(/every\s+(\d+(?:\.\d+)?)(ms|s|m)?/) : null;
+    if (match === null) {
+        return null;
+    }
+    let factor = {"ms": 0.001, "s": 1, "m": 60}[match[2] ?? "ms"];
+    return parseFloat(match[1]) * factor;
+}
+
+document.body.addEventListener('htmx:configRequest', function (evt) {
+    let interval = evt.detail.verb === "get" ? getPollInterval(evt.detail.elt) : null;
+    if (interval !== null) {
+        evt.detail.headers["X-Hyperpony-Poll-Interval"] = interval.toString();
+    }
+});
+
+document.body.addEventListener('htmx:afterRequest', function (evt) {
+    let interval = evt.detail.xhr.getResponseHeader("X-Hyperpony-Poll-Interval");
+    if (interval === null) {
+        return;
+    }
+
+    // the polling element may have been replaced by the response
+    let el = evt.detail.elt;
+    if (!el.isConnected && el.id) {
+        el = document.getElementById(el.id);
+    }
+    if (el === null || !el.isConnected || getPollInterval(el) === parseFloat(interval)) {
+        return;
+    }
+
+    let trigger = el.getAttribute("hx-trigger");
+    el.setAttribute("hx-trigger", trigger.replace(/every\s+\d+(?:\.\d+)?(ms|s|m)?/, "every " + interval + "s"));
+    // htmx re-initializes elements whose attributes changed, which restarts the polling timer
+    htmx.process(el);
+});
+
+function connectServerSentEvents(el) {
+    if (el.hyperponyEventSource !== undefined) {
+        return;
+    }
+    let source = new EventSource(el.getAttribute("hyperpony-sse"));
+    source.addEventListener("hyperpony-oob", function (evt) {
+        // the fragments only contain OOB swaps, targets missing on this page are ignored
+        htmx.swap(document.body, evt.data, {swapStyle: "none"});
+    });
+    el.hyperponyEventSource = source;
+}
+
+htmx.onLoad(function (content) {
+    if (content.matches("[hyperpony-sse]")) {
+        connectServerSentEvents(content);
+    }
+    content.querySelectorAll("[hyperpony-sse]").forEach(connectServerSentEvents);
+});
+
+document.body.addEventListener("htmx:beforeCleanupElement", function (evt) {
+    let source = evt.target.hyperponyEventSource;
+    if (source !== undefined) {
+        source.close();
+        delete evt.target.hyperponyEventSource;
+    }
+});
@@ -1,8 +1,34 @@
-from typing import cast, Any
+from contextlib import contextmanager
+from typing import cast, Any, Iterator, Union
 
 from django.http import HttpResponseBase
 
+from hyperpony.queries import QueryLog, capture_query_logs
+
 
 # noinspection PyUnusedLocal
 def view_from_response[T](view_class: type[T], response: HttpResponseBase) -> T:
     return cast(Any, cast(Any, response).view)
+
+
+@contextmanager
+def assert_max_queries_per_element(
+    budgets: dict[Union[type, str], int],
+) -> Iterator[list[QueryLog]]:
+    """
+    Fails if a single render of an element class within the `with` block runs more
+    queries than its budget. Queries of nested elements count for the nested element.
+    """
+    with capture_query_logs() as logs:
+        yield logs
+
+    names = {(k if isinstance(k, str) else k.__name__): v for k, v in budgets.items()}
+    violations = []
+    for log in logs:
+        for (element, _), count in log.counts_per_embed().items():
+            budget = names.get(element)
+            if budget is not None and count > budget:
+                queries = [q.sql for q in log.queries if q.element == element]
+                violations.append(f"{element} ran {count} queries (budget {budget}): {queries}")
+    if violations:
+        raise AssertionError("\n".join(violations))
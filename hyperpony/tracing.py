@@ -0,0 +1,213 @@
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import orjson
+from django.conf import settings
+
+
+# attribute names shared by all spans
+ATTR_ELEMENT_ID = "hyperpony.element.id"
+ATTR_ELEMENT_CLASS = "hyperpony.element.class"
+ATTR_VIEW_CLASS = "hyperpony.view.class"
+ATTR_PATH_NAME = "hyperpony.path_name"
+ATTR_KIND = "hyperpony.kind"
+ATTR_HANDLER = "hyperpony.handler"
+ATTR_BYTES = "hyperpony.bytes"
+
+
+def is_tracing_enabled() -> bool:
+    return getattr(settings, "HYPERPONY_TRACING", False)
+
+
+@dataclass()
+class Span:
+    """
+    A timed operation of the render pipeline. Ids and times use the OpenTelemetry
+    formats: hex encoded trace and span ids and nanoseconds since the epoch.
+    """
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_time: int = 0
+    end_time: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "OK"
+    parent: Optional["Span"] = field(default=None, repr=False, compare=False)
+    # used by span processors to attach their own state, e.g. the native OTel span
+    native: Any = field(default=None, repr=False, compare=False)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration(self) -> float:
+        return (self.end_time - self.start_time) / 1e9
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class SpanProcessor:
+    """
+    Receives spans when they start and end. Subclasses override one or both hooks.
+    """
+
+    def on_start(self, span: Span):
+        pass
+
+    def on_end(self, span: Span):
+        pass
+
+
+class InMemorySpanExporter(SpanProcessor):
+    """
+    Keeps all finished spans in memory. Intended for tests.
+    """
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+class JsonLinesSpanExporter(SpanProcessor):
+    """
+    Appends every finished span as a JSON object to `path`, one span per line.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span):
+        line = orjson.dumps(span.to_dict(), default=str) + b"\n"
+        with self._lock, self.path.open("ab") as f:
+            f.write(line)
+
+
+class OpenTelemetrySpanProcessor(SpanProcessor):
+    """
+    Mirrors the spans into the OpenTelemetry SDK, keeping their parent-child relations.
+    Requires the `opentelemetry-api` package.
+    """
+
+    def __init__(self, tracer: Any = None):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("hyperpony")
+
+    def on_start(self, span: Span):
+        parent = span.parent
+        context = (
+            self._trace.set_span_in_context(parent.native)
+            if parent is not None and parent.native is not None
+            else None
+        )
+        span.native = self.tracer.start_span(span.name, context=context, start_time=span.start_time)
+
+    def on_end(self, span: Span):
+        if span.native is None:
+            return
+        span.native.set_attributes(span.attributes)
+        if span.status != "OK":
+            span.native.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        span.native.end(end_time=span.end_time)
+
+
+_processors: list[SpanProcessor] = []
+_current_span: ContextVar[Optional[Span]] = ContextVar("hyperpony_current_span", default=None)
+
+
+def add_span_processor(processor: SpanProcessor):
+    _processors.append(processor)
+
+
+def remove_span_processor(processor: SpanProcessor):
+    _processors.remove(processor)
+
+
+def get_current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class _SpanContext:
+    __slots__ = ("span", "token")
+
+    def __init__(self, name: str, attributes: dict[str, Any]):
+        parent = _current_span.get()
+        self.span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}",
+            span_id=f"{random.getrandbits(64):016x}",
+            parent_id=parent.span_id if parent is not None else None,
+            attributes=attributes,
+            parent=parent,
+        )
+
+    def __enter__(self) -> Span:
+        span = self.span
+        span.start_time = time.time_ns()
+        self.token = _current_span.set(span)
+        for processor in _processors:
+            processor.on_start(span)
+        return span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        span = self.span
+        span.end_time = time.time_ns()
+        if exc_type is not None:
+            span.status = "ERROR"
+            span.attributes.setdefault("exception.type", exc_type.__name__)
+        _current_span.reset(self.token)
+        for processor in _processors:
+            processor.on_end(span)
+        return False
+
+
+class _NoopSpanContext:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP = _NoopSpanContext()
+
+
+def start_span(
+    name: str, attributes: Optional[dict[str, Any]] = None
+) -> Union[_SpanContext, _NoopSpanContext]:
+    """
+    Returns a context manager that records a span for the `with` block. It yields the
+    span, or None if tracing is disabled or no span processor is registered.
+    """
+    if not _processors or not is_tracing_enabled():
+        return _NOOP
+    return _SpanContext(name, attributes or {})
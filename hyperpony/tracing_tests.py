@@ -0,0 +1,102 @@
+import orjson
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views import View
+
+from hyperpony import HyperponyElementMixin, SingletonPathMixin, param
+from hyperpony.response_handler import add_response_handler, process_response
+from hyperpony.tracing import (
+    InMemorySpanExporter,
+    JsonLinesSpanExporter,
+    add_span_processor,
+    remove_span_processor,
+    start_span,
+)
+
+
+class TracedElement(SingletonPathMixin, HyperponyElementMixin, View):
+    name: str = param("x")
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(self.name)
+
+
+urlpatterns = [
+    TracedElement.create_path(),
+]
+
+
+@pytest.fixture()
+def exporter():
+    exporter = InMemorySpanExporter()
+    add_span_processor(exporter)
+    yield exporter
+    remove_span_processor(exporter)
+
+
+@pytest.mark.urls("hyperpony.tracing_tests")
+@override_settings(HYPERPONY_TRACING=True)
+def test_spans_of_embedded_element(rf: RequestFactory, exporter: InMemorySpanExporter):
+    content = TracedElement.embed(rf.get("/"), GET={"name": "abc"})
+
+    spans = {s.name: s for s in exporter.spans}
+    assert set(spans) == {
+        "hyperpony.invoke_view",
+        "hyperpony.params",
+        "hyperpony.view",
+        "hyperpony.client_state.encode",
+        "hyperpony.wrap",
+    }
+    invoke = spans["hyperpony.invoke_view"]
+    assert invoke.parent_id is None
+    assert invoke.attributes["hyperpony.path_name"] == TracedElement.get_path_name()
+    assert invoke.attributes["hyperpony.kind"] == "embed"
+    assert invoke.attributes["hyperpony.bytes"] == len(content)
+    assert spans["hyperpony.params"].parent_id == invoke.span_id
+    assert spans["hyperpony.view"].attributes["hyperpony.element.class"] == "TracedElement"
+    assert spans["hyperpony.wrap"].attributes["hyperpony.bytes"] == len(content) - len("abc")
+    assert all(s.trace_id == invoke.trace_id for s in exporter.spans)
+    assert all(s.end_time >= s.start_time for s in exporter.spans)
+
+
+@override_settings(HYPERPONY_TRACING=True)
+def test_response_handler_spans(rf: RequestFactory, exporter: InMemorySpanExporter):
+    def my_handler(response):
+        raise ValueError()
+
+    req = rf.get("/")
+    add_response_handler(req, my_handler)
+    with pytest.raises(ValueError):
+        process_response(req, HttpResponse(""))
+
+    [span] = exporter.spans
+    assert span.name == "hyperpony.response_handler"
+    assert span.attributes["hyperpony.handler"].endswith("my_handler")
+    assert span.status == "ERROR"
+
+
+@override_settings(HYPERPONY_TRACING=False)
+def test_tracing_disabled(exporter: InMemorySpanExporter):
+    with start_span("test") as span:
+        assert span is None
+    assert exporter.spans == []
+
+
+@override_settings(HYPERPONY_TRACING=True)
+def test_json_lines_exporter(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    exporter = JsonLinesSpanExporter(path)
+    add_span_processor(exporter)
+    try:
+        with start_span("outer", {"a": 1}):
+            with start_span("inner"):
+                pass
+    finally:
+        remove_span_processor(exporter)
+
+    inner, outer = [orjson.loads(line) for line in path.read_bytes().splitlines()]
+    assert inner["name"] == "inner"
+    assert outer["name"] == "outer"
+    assert outer["attributes"] == {"a": 1}
+    assert inner["parent_id"] == outer["span_id"]
@@ -1,8 +1,20 @@
+import itertools
 from types import UnionType
-from typing import Any, TypeVar, Callable, get_origin, Union, get_args, Optional
-
-from django.http import HttpRequest, HttpResponse, HttpResponseBase
-from django.template.response import TemplateResponse
+from typing import (
+    Any,
+    AsyncIterable,
+    TypeVar,
+    Callable,
+    cast,
+    get_origin,
+    Union,
+    get_args,
+    Iterable,
+    Optional,
+)
+
+from django.http import HttpRequest, HttpResponse, HttpResponseBase, StreamingHttpResponse
+from django.template.response import SimpleTemplateResponse, TemplateResponse
 from django.utils.safestring import mark_safe, SafeString
 
 
@@ -17,17 +29,63 @@ def response_to_str(response: HttpResponseBase | TemplateResponse) -> SafeString
     if isinstance(response, TemplateResponse):
         response = response.render()
 
+    if isinstance(response, StreamingHttpResponse):
+        if getattr(response, "is_async", False):
+            raise TypeError("Unable to convert an asynchronous streaming response to str.")
+        return mark_safe(str(b"".join(response.streaming_content), "utf-8"))
+
     return mark_safe(str(response.content, "utf-8"))
 
 
+def render_response(response: HttpResponseBase) -> HttpResponseBase:
+    if isinstance(response, SimpleTemplateResponse) and not response.is_rendered:
+        response.render()
+    return response
+
+
+def surround_response_content(response: HttpResponse, prefix: bytes, suffix: bytes):
+    """
+    Surrounds the content of `response` with `prefix` and `suffix` without decoding
+    or copying the content. The chunks are joined once when the content is read.
+    """
+    response._container = [prefix, *response._container, suffix]  # noqa: SLF001
+    response.__dict__.pop("text", None)
+
+
+def surround_streaming_content(response: StreamingHttpResponse, prefix: bytes, suffix: bytes):
+    """
+    Surrounds the streamed content of `response` with `prefix` and `suffix`. The inner
+    iterator (sync or async) is consumed lazily, so memory use stays bounded.
+    """
+    content = response.streaming_content
+    if getattr(response, "is_async", False):
+
+        async def achunks():
+            yield prefix
+            async for chunk in cast(AsyncIterable[bytes], content):
+                yield chunk
+            yield suffix
+
+        response.streaming_content = achunks()
+    else:
+        response.streaming_content = itertools.chain(
+            (prefix,), cast(Iterable[bytes], content), (suffix,)
+        )
+
+
+def response_content_length(response: HttpResponse) -> int:
+    return sum(len(chunk) for chunk in response)
+
+
 def is_response_processable(response: HttpResponseBase, content_type_start: str) -> bool:
-    if isinstance(response, HttpResponse) and response.streaming:
+    if getattr(response, "streaming", False):
         return False
 
-    if not response["Content-Type"].startswith(content_type_start.lower().strip()):
-        return False
+    return has_content_type(response, content_type_start)
+
 
-    return True
+def has_content_type(response: HttpResponseBase, content_type_start: str) -> bool:
+    return response.get("Content-Type", "").startswith(content_type_start.lower().strip())
 
 
 def text_response_to_str_or_none(response: HttpResponseBase) -> str | None:
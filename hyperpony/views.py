@@ -1,13 +1,38 @@
+import re
+import time
+from dataclasses import dataclass, field
 from io import BytesIO
-from typing import cast, Optional, Union, Any
+from typing import cast, Optional, Union, Any, Iterable
 
 from django.db.models import Model
 from django.http import HttpRequest, HttpResponse, QueryDict
 from django.urls import path, reverse, ResolverMatch, resolve
-
-from hyperpony.htmx import swap_oob
-from hyperpony.response_handler import RESPONSE_HANDLER, add_response_handler
-from hyperpony.utils import response_to_str
+from django.urls.converters import get_converters
+from django.utils.datastructures import MultiValueDict
+
+from hyperpony.context import HyperponyContext, get_hyperpony_context
+from hyperpony.deadlines import (
+    check_render_budget,
+    is_budget_exhausted,
+    placeholder_response,
+    record_fallback,
+)
+from hyperpony.element import ElementAttrsMixin, ElementIdMixin  # noqa: F401
+from hyperpony.guardrails import guard_embed
+from hyperpony.memory import trace_memory
+from hyperpony.queries import inspect_embed_queries
+from hyperpony.htmx import is_htmx_request, swap_oob
+from hyperpony.profiler import get_response_bytes, profile_embed, record_response_bytes
+from hyperpony.response_handler import (
+    RESPONSE_HANDLER,
+    add_response_handler,
+    get_response_handlers_from_request,
+)
+from hyperpony.tracing import ATTR_BYTES, ATTR_KIND, ATTR_PATH_NAME, ATTR_VIEW_CLASS, start_span
+from hyperpony.utils import is_response_processable, response_to_str
+
+# the parameters of path() routes, e.g. <uuid:item>
+_ROUTE_PARAMETER_RE = re.compile(r"<(?:(?P<converter>[^>:]+):)?(?P<parameter>[^>]+)>")
 
 
 def is_head(request: HttpRequest) -> bool:
@@ -100,17 +125,20 @@ class ViewUtilsMixin:
         view_kwargs: dict | None = None,
         hx_swap_oob_method="outerHTML",
     ):
-        self.add_swap_oob(
-            invoke_view(
-                self.request,  # type: ignore
-                path_name,
-                GET=GET,
-                POST=POST,
-                args=args,
-                kwargs=kwargs,
-                view_kwargs=view_kwargs,
-            ),
-            hx_swap_oob_method=hx_swap_oob_method,
+        """
+        Adds an out-of-band (OOB) swap of the view `path_name`. The view is rendered
+        when the response is processed, and only if the final response is a
+        successful text/html response to an htmx request.
+        """
+        add_deferred_swap_oob(
+            self.request,  # type: ignore
+            path_name,
+            hx_swap=hx_swap_oob_method,
+            GET=GET,
+            POST=POST,
+            args=args,
+            kwargs=kwargs,
+            view_kwargs=view_kwargs,
         )
 
     def is_embedded_view(self):
@@ -127,6 +155,42 @@ def invoke_view(
     kwargs: dict | None = None,
     view_kwargs: dict | None = None,
 ) -> HttpResponse:
+    return _invoke_view(
+        request,
+        path_name,
+        "invoke_view",
+        GET=GET,
+        POST=POST,
+        args=args,
+        kwargs=kwargs,
+        view_kwargs=view_kwargs,
+    )
+
+
+# noinspection PyPep8Naming
+def _invoke_view(
+    request: HttpRequest,
+    path_name: str,
+    kind: str,
+    *,
+    GET: Union[QueryDict, dict, None] = None,  # noqa: N803
+    POST: Union[QueryDict, dict, None] = None,  # noqa: N803
+    args=None,
+    kwargs: dict | None = None,
+    view_kwargs: dict | None = None,
+) -> HttpResponse:
+    get_qd, post_qd = _to_query_dicts(GET, POST)
+    url = _reverse(path_name, args, kwargs)
+    return _invoke_resolved_view(
+        request, path_name, kind, url, resolve(url), get_qd, post_qd, kwargs, view_kwargs
+    )
+
+
+# noinspection PyPep8Naming
+def _to_query_dicts(
+    GET: Union[QueryDict, dict, None],  # noqa: N803
+    POST: Union[QueryDict, dict, None],  # noqa: N803
+) -> tuple[QueryDict, Optional[QueryDict]]:
     if isinstance(GET, dict):
         get_qd = QueryDict(mutable=True)
         get_qd.update(GET)
@@ -139,18 +203,33 @@ def invoke_view(
         post_qd.update(POST)
     else:
         post_qd = POST
+    return get_qd, post_qd
 
-    embedded_req = EmbeddedRequest.create(request, get_qd, post_qd)
 
+def _reverse(path_name: str, args, kwargs: dict | None) -> str:
     reverse_args = [_cleanup_value_path_reverse(a) for a in args] if args is not None else None
     reverse_kwargs = (
         {k: _cleanup_value_path_reverse(v) for k, v in kwargs.items()}
         if kwargs is not None
         else None
     )
+    return reverse(path_name, args=reverse_args, kwargs=reverse_kwargs)
+
 
-    url = reverse(path_name, args=reverse_args, kwargs=reverse_kwargs)
-    rm: ResolverMatch = resolve(url)
+def _invoke_resolved_view(
+    request: HttpRequest,
+    path_name: str,
+    kind: str,
+    url: str,
+    rm: ResolverMatch,
+    get_qd: QueryDict,
+    post_qd: Optional[QueryDict],
+    kwargs: dict | None,
+    view_kwargs: dict | None,
+) -> HttpResponse:
+    view_class = getattr(rm.func, "view_class", rm.func)
+
+    embedded_req = EmbeddedRequest.create(request, get_qd, post_qd)
     embedded_req.path = url
     embedded_req.path_info = url
     embedded_req.resolver_match = rm
@@ -166,10 +245,138 @@ def invoke_view(
             if isinstance(v, Model):
                 embedded_req.hyperpony_params_bypass_values[k] = v
 
-    response = rm.func(embedded_req, *rm.args, **invoke_kwargs)
+    # only GET embeds without view_kwargs can be lazy-loaded by the client
+    if (
+        kind == "embed"
+        and post_qd is None
+        and not view_kwargs
+        and is_budget_exhausted(request, view_class)
+    ):
+        record_fallback(view_class)
+        with profile_embed(request, "placeholder", view_class.__name__, path_name):
+            element_id = _get_element_id(rm, embedded_req, invoke_kwargs)
+            query = get_qd.urlencode()
+            return placeholder_response(element_id, f"{url}?{query}" if query else url)
+
+    with (
+        guard_embed(request, view_class),
+        profile_embed(request, kind, view_class.__name__, path_name) as node,
+        trace_memory(request, kind, view_class.__name__),
+        inspect_embed_queries(request, view_class),
+        start_span(
+            "hyperpony.invoke_view",
+            {ATTR_PATH_NAME: path_name, ATTR_KIND: kind, ATTR_VIEW_CLASS: view_class.__name__},
+        ) as span,
+    ):
+        start = time.perf_counter()
+        response = rm.func(embedded_req, *rm.args, **invoke_kwargs)
+        check_render_budget(view_class, time.perf_counter() - start)
+        if node is not None:
+            record_response_bytes(node, response)
+        if span is not None:
+            span.set_attribute(ATTR_BYTES, get_response_bytes(response))
     return response
 
 
+def _get_element_id(rm: ResolverMatch, request: HttpRequest, kwargs: dict) -> str:
+    """
+    Returns the id the element would render with, without dispatching the view.
+    """
+    view_class = getattr(rm.func, "view_class", None)
+    if view_class is None or not hasattr(view_class, "get_element_id"):
+        return getattr(rm.func, "__name__", "placeholder")
+    view = view_class(**getattr(rm.func, "view_initkwargs", {}))
+    view.setup(request, *rm.args, **kwargs)
+    return view.get_element_id()
+
+
+@dataclass()
+class DeferredSwapOob:
+    """
+    Response handler that renders a view as OOB swap once the final response is
+    known. Equal deferred swaps of a request are only registered once.
+    """
+
+    request: HttpRequest = field(compare=False)
+    path_name: str
+    hx_swap: str
+    GET: Union[QueryDict, dict, None]
+    POST: Union[QueryDict, dict, None]
+    args: Any
+    kwargs: dict | None
+    view_kwargs: dict | None
+
+    def __call__(self, response: HttpResponse) -> Optional[HttpResponse]:
+        if not is_htmx_request(self.request):
+            return None
+        if not 200 <= response.status_code < 300:
+            return None
+        if not is_response_processable(response, "text/html"):
+            return None
+
+        oob_response = _invoke_view(
+            self.request,
+            self.path_name,
+            "swap_oob",
+            GET=self.GET,
+            POST=self.POST,
+            args=self.args,
+            kwargs=self.kwargs,
+            view_kwargs=self.view_kwargs,
+        )
+        return swap_oob(response, oob_response, self.hx_swap)
+
+    def key(self) -> Optional[tuple]:
+        """
+        Hashable key of the swap, equal for equal swaps. None if an argument is not
+        hashable.
+        """
+        key = (
+            self.path_name,
+            self.hx_swap,
+            *(_freeze(v) for v in (self.GET, self.POST, self.args, self.kwargs, self.view_kwargs)),
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+
+def _freeze(value):
+    if isinstance(value, MultiValueDict):
+        return frozenset((k, _freeze(v)) for k, v in value.lists())
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# noinspection PyPep8Naming
+def add_deferred_swap_oob(
+    request: HttpRequest,
+    path_name: str,
+    *,
+    hx_swap="outerHTML",
+    GET: Union[QueryDict, dict, None] = None,  # noqa: N803
+    POST: Union[QueryDict, dict, None] = None,  # noqa: N803
+    args=None,
+    kwargs: dict | None = None,
+    view_kwargs: dict | None = None,
+):
+    deferred = DeferredSwapOob(request, path_name, hx_swap, GET, POST, args, kwargs, view_kwargs)
+    key = deferred.key()
+    if key is None:
+        if deferred not in get_response_handlers_from_request(request):
+            add_response_handler(request, deferred)
+        return
+    registered = get_hyperpony_context(request).deferred_swap_oobs
+    if key not in registered:
+        registered.add(key)
+        add_response_handler(request, deferred)
+
+
 def _cleanup_value_path_reverse(value):
     if isinstance(value, Model):
         return str(value.pk)
@@ -187,12 +394,102 @@ def embed_view(
     kwargs: dict | None = None,
     view_kwargs: dict | None = None,
 ) -> str:
-    response = invoke_view(
-        request, path_name, GET=GET, POST=POST, args=args, kwargs=kwargs, view_kwargs=view_kwargs
+    response = _invoke_view(
+        request,
+        path_name,
+        "embed",
+        GET=GET,
+        POST=POST,
+        args=args,
+        kwargs=kwargs,
+        view_kwargs=view_kwargs,
     )
     return response_to_str(response)
 
 
+# noinspection PyPep8Naming
+def embed_view_batch(
+    request: HttpRequest,
+    path_name: str,
+    kwargs_list: Iterable[dict],
+    *,
+    GET: Union[QueryDict, dict, None] = None,  # noqa: N803
+    POST: Union[QueryDict, dict, None] = None,  # noqa: N803
+    view_kwargs: dict | None = None,
+) -> list[str]:
+    """
+    Embeds the same view once per entry of `kwargs_list` and returns the rendered
+    fragments in order. Each entry is used like the `kwargs` of `embed_view()`.
+
+    The URL is resolved once for the first entry, the other entries reuse its
+    `ResolverMatch`. If the view class implements `preload_params()`
+    (e.g. `InjectParamsMixin`), model parameters are loaded with a single query
+    instead of one query per entry.
+    """
+    kwargs_list = [dict(kwargs) for kwargs in kwargs_list]
+    if len(kwargs_list) == 0:
+        return []
+
+    get_qd, post_qd = _to_query_dicts(GET, POST)
+
+    first = resolve(_reverse(path_name, None, kwargs_list[0]))
+    view_class = getattr(first.func, "view_class", None)
+    if preload_params := getattr(view_class, "preload_params", None):
+        preload_params(kwargs_list)
+
+    converters = _get_route_converters(first.route)
+    fragments = []
+    for kwargs in kwargs_list:
+        # the URL is still needed for the embedded request's path
+        url = _reverse(path_name, None, kwargs)
+        rm = _with_route_kwargs(first, converters, kwargs)
+        response = _invoke_resolved_view(
+            request, path_name, "embed", url, rm, get_qd, post_qd, kwargs, view_kwargs
+        )
+        fragments.append(response_to_str(response))
+    return fragments
+
+
+def _get_route_converters(route: str) -> dict[str, Any]:
+    registered = get_converters()
+    return {
+        m["parameter"]: registered.get(m["converter"] or "str")
+        for m in _ROUTE_PARAMETER_RE.finditer(route)
+    }
+
+
+def _with_route_kwargs(
+    rm: ResolverMatch, converters: dict[str, Any], kwargs: dict
+) -> ResolverMatch:
+    """
+    Returns a copy of `rm` with the URL kwargs of `kwargs`, converted like `resolve()`
+    would convert them, without resolving the URL again.
+    """
+    captured = {}
+    for k, v in kwargs.items():
+        value = _cleanup_value_path_reverse(v)
+        converter = converters.get(k)
+        # to_url() receives the Python value, like with reverse()
+        captured[k] = converter.to_python(converter.to_url(value)) if converter else str(value)
+    extra = getattr(rm, "extra_kwargs", {})
+    return ResolverMatch(
+        rm.func,
+        rm.args,
+        {**rm.kwargs, **captured, **extra},
+        rm.url_name,
+        rm.app_names,
+        rm.namespaces,
+        rm.route,
+        rm.tried,
+        # Django >= 4.1
+        **(
+            {"captured_kwargs": {**rm.captured_kwargs, **captured}, "extra_kwargs": extra}
+            if hasattr(rm, "captured_kwargs")
+            else {}
+        ),
+    )
+
+
 def is_embedded_request(request: HttpRequest) -> bool:
     return isinstance(request, EmbeddedRequest)
 
@@ -284,6 +581,28 @@ class SingletonPathMixin:
             view_kwargs=view_kwargs,
         )
 
+    # noinspection PyPep8Naming
+    @classmethod
+    def embed_batch(
+        cls,
+        request: HttpRequest,
+        kwargs_list: Iterable[dict],
+        *,
+        GET: Union[QueryDict, dict, None] = None,  # noqa: N803
+        POST: Union[QueryDict, dict, None] = None,  # noqa: N803
+        view_kwargs: dict | None = None,
+    ) -> list[str]:
+        """
+        Batch version of `embed()` for rendering many instances of the same view,
+        e.g. the rows of a list. See `embed_view_batch()`.
+        """
+        path_name = cls.get_path_name()
+        if path_name is None:
+            raise Exception(f"View {cls} was not registered with create_path().")
+        return embed_view_batch(
+            request, path_name, kwargs_list, GET=GET, POST=POST, view_kwargs=view_kwargs
+        )
+
     # noinspection PyPep8Naming
     @classmethod
     def swap_oob(
@@ -297,12 +616,18 @@ class SingletonPathMixin:
         kwargs: dict | None = None,
         view_kwargs: dict | None = None,
     ):
-        self_response = cls.invoke(
-            request, GET=GET, POST=POST, args=args, kwargs=kwargs, view_kwargs=view_kwargs
-        )
-        add_response_handler(
+        path_name = cls.get_path_name()
+        if path_name is None:
+            raise Exception(f"View {cls} was not registered with create_path().")
+        add_deferred_swap_oob(
             request,
-            lambda response: swap_oob(response, self_response, hx_swap),
+            path_name,
+            hx_swap=hx_swap,
+            GET=GET,
+            POST=POST,
+            args=args,
+            kwargs=kwargs,
+            view_kwargs=view_kwargs,
         )
 
     @classmethod
@@ -314,6 +639,8 @@ class SingletonPathMixin:
 
 class EmbeddedRequest(HttpRequest):
     hyperpony_params_bypass_values: dict
+    hyperpony_context: HyperponyContext
+    hyperpony_embedded = True
 
     @classmethod
     def create(
@@ -324,6 +651,7 @@ class EmbeddedRequest(HttpRequest):
     ):
         self = cls()
         self.hyperpony_params_bypass_values = {}
+        self.hyperpony_context = get_hyperpony_context(original_request)
         self.__original_request = original_request
         self._read_started = False
         self._stream = BytesIO()
@@ -338,15 +666,3 @@ class EmbeddedRequest(HttpRequest):
 
     def __getattr__(self, name):
         return getattr(self.__original_request, name)
-
-
-class ElementIdMixin:
-    element_id: Optional[str] = None
-
-    def get_element_id(self) -> str:
-        return self.element_id or self.__class__.__name__
-
-
-class ElementAttrsMixin:
-    def get_attrs(self) -> dict[str, str]:
-        return {}
@@ -2,15 +2,22 @@ import uuid
 from typing import cast
 
 import pytest
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, QueryDict
 from django.test import RequestFactory
-from django.urls import path
+from django.urls import path, register_converter
 from django.views import View
 
-from hyperpony import ViewUtilsMixin, SingletonPathMixin
+from hyperpony import ElementMixin, ViewUtilsMixin, SingletonPathMixin
+from hyperpony.response_handler import get_response_handlers_from_request, process_response
 from hyperpony.testutils import view_from_response
 from hyperpony.utils import response_to_str, text_response_to_str_or_none
-from hyperpony.views import invoke_view, is_embedded_request, EmbeddedRequest, is_get
+from hyperpony.views import (
+    DeferredSwapOob,
+    EmbeddedRequest,
+    invoke_view,
+    is_embedded_request,
+    is_get,
+)
 from main.models import AppUser
 
 
@@ -55,6 +62,32 @@ class TViewSingletonWithCustomName(TViewSingleton):
     pass
 
 
+class TViewOOBElement(SingletonPathMixin, ElementMixin, View):
+    renders = 0
+
+    def get(self, request, *args, **kwargs):
+        TViewOOBElement.renders += 1
+        return HttpResponse(request.GET.get("content", "oob"))
+
+
+class FourDigitYearConverter:
+    regex = "[0-9]{4}"
+
+    def to_python(self, value):
+        return int(value)
+
+    def to_url(self, value):
+        return "%04d" % value
+
+
+register_converter(FourDigitYearConverter, "yyyy")
+
+
+class TViewYear(SingletonPathMixin, View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(f"{kwargs['year']!r}")
+
+
 urlpatterns = [
     path("view1/", TView.as_view(), name="view1"),
     path("viewkwargs/", TViewKwargs.as_view(), name="view_kwargs"),
@@ -65,6 +98,8 @@ urlpatterns = [
     TViewSingletonPathEndParam.create_path("<param1>"),
     TViewSingletonPathStartPathEnd.create_path(full_path="full_path/<param1>"),
     TViewSingletonWithCustomName.create_path(name="custom_name"),
+    TViewOOBElement.create_path(),
+    TViewYear.create_path("<yyyy:year>"),
 ]
 
 
@@ -196,3 +231,63 @@ def test_viewutils_params(rf: RequestFactory):
     app_user = AppUser.objects.create(username="testuser")
     view = view_from_response(TView, invoke_view(r, "view-param1", kwargs=dict(param1=app_user)))
     assert view.kwargs == {"param1": str(app_user.id)}
+
+
+# #######################################################################
+# ### deferred OOB swaps
+# #######################################################################
+
+
+@pytest.mark.urls("hyperpony.views_tests")
+def test_swap_oob_is_rendered_at_response_time(rf: RequestFactory):
+    TViewOOBElement.renders = 0
+    req = rf.get("/", HTTP_HX_REQUEST="true")
+    TViewOOBElement.swap_oob(req, GET={"content": "a"})
+    TViewOOBElement.swap_oob(req, GET={"content": "a"})
+    assert TViewOOBElement.renders == 0
+
+    res = process_response(req, HttpResponse("main"))
+    assert TViewOOBElement.renders == 1
+    content = response_to_str(res)
+    assert content.startswith("main<div hx-swap-oob='outerHTML:#TViewOOBElement' ")
+    assert content.endswith(">a</div>")
+
+
+@pytest.mark.urls("hyperpony.views_tests")
+def test_swap_oob_deduplicates_without_comparing_handlers(rf: RequestFactory, monkeypatch):
+    def fail_eq(self, other):
+        raise AssertionError("deferred swaps compared")
+
+    monkeypatch.setattr(DeferredSwapOob, "__eq__", fail_eq)
+    req = rf.get("/", HTTP_HX_REQUEST="true")
+    for i in range(1000):
+        TViewOOBElement.swap_oob(req, GET={"content": str(i % 500)})
+    TViewOOBElement.swap_oob(req, GET=QueryDict("content=1"))
+    assert len(get_response_handlers_from_request(req)) == 501
+
+
+@pytest.mark.urls("hyperpony.views_tests")
+def test_swap_oob_is_skipped_for_non_htmx_requests(rf: RequestFactory):
+    TViewOOBElement.renders = 0
+    req = rf.get("/")
+    TViewOOBElement.swap_oob(req)
+    res = process_response(req, HttpResponse("main"))
+    assert TViewOOBElement.renders == 0
+    assert response_to_str(res) == "main"
+
+
+@pytest.mark.urls("hyperpony.views_tests")
+def test_swap_oob_is_skipped_for_redirects_and_json(rf: RequestFactory):
+    TViewOOBElement.renders = 0
+    req = rf.get("/", HTTP_HX_REQUEST="true")
+    TViewOOBElement.swap_oob(req)
+    process_response(req, HttpResponseRedirect("/"))
+    process_response(req, JsonResponse({}))
+    assert TViewOOBElement.renders == 0
+
+
+@pytest.mark.urls("hyperpony.views_tests")
+def test_embed_batch_uses_custom_route_converters(rf: RequestFactory):
+    req = rf.get("/")
+    assert TViewYear.embed_batch(req, [{"year": 2024}, {"year": 99}]) == ["2024", "99"]
+    assert str(TViewYear.embed(req, kwargs={"year": 99})) == "99"
@@ -2,6 +2,8 @@ import os
 import sys
 from pathlib import Path
 
+from debug_toolbar.settings import PANELS_DEFAULTS
+
 
 #######################################################################################
 
@@ -186,3 +188,7 @@ LOGGING = {
     },
 }
 INTERNAL_IPS = ["127.0.0.1"]
+
+# Hyperpony
+HYPERPONY_PROFILER = DEBUG
+DEBUG_TOOLBAR_PANELS = [*PANELS_DEFAULTS, "hyperpony.panels.EmbedTreePanel"]